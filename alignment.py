@@ -0,0 +1,96 @@
+__author__ = 'emptysamurai'
+
+from bisect import bisect_left
+from heapq import nsmallest
+from operator import itemgetter
+from timeinterval import IntervalArray
+
+_MIN_LENGTH_RATIO = 0.5
+_MAX_LENGTH_RATIO = 1.8
+_BEAM_WIDTH = 128
+_PRUNING_RATIO = 1.5
+_MAX_CANDIDATES = 2
+
+
+def _synthetic_silence(end, sentence_length, average_silence_interval_length):
+    # a silence made up right where the sentence is expected to end
+    end += sentence_length
+    if sentence_length > average_silence_interval_length:
+        return end - average_silence_interval_length, end
+    else:
+        return end - sentence_length / 2.5, end
+
+
+def align(silences, sentences_lengths, average_silence_interval_length, beam_width=_BEAM_WIDTH, last_silence=None):
+    """Chooses the silence after every sentence, starting from the first silence.
+
+    Sentence boundaries are found with dynamic programming over (sentence, silence) states that
+    minimizes total deviation of sentences from their expected lengths. Candidates are the few
+    silences nearest to the expected end found with bisect, beginning within [0.5, 1.8] of the
+    expected length. When no silence fits after a state, a synthetic one is placed at the expected
+    end at the cost of the whole sentence length. After each sentence only the beam_width cheapest
+    states within 1.5 times the sentence length of the best one are kept, so time is linear in the
+    number of sentences and doesn't grow much with pauses inside sentences. When last_silence is
+    given, the last sentence always ends there and no earlier silence ends after its beginning.
+    Returns an IntervalArray of len(sentences_lengths) + 1 silences.
+    """
+    silences = IntervalArray.from_intervals(silences).sorted()
+    begins = silences.begins.tolist()
+    ends = silences.ends.tolist()
+    count = len(begins)
+    limit = last_silence.begin if last_silence is not None else None
+
+    # state: (cost, begin, end, parent state index in the previous step)
+    states = [(0, begins[0], ends[0], None)]
+    history = []
+    for k, sentence_length in enumerate(sentences_lengths):
+        if last_silence is not None and k == len(sentences_lengths) - 1:
+            costs = [cost + abs(last_silence.begin - end - sentence_length) for cost, _, end, _ in states]
+            parent = min(range(len(states)), key=costs.__getitem__)
+            states = [(costs[parent], last_silence.begin, last_silence.end, parent)]
+            history.append(states)
+            break
+        min_length = sentence_length * _MIN_LENGTH_RATIO
+        max_length = sentence_length * _MAX_LENGTH_RATIO
+        best = {}
+        synthetic = []
+        for parent, (cost, _, end, _) in enumerate(states):
+            expected_begin = end + sentence_length
+            min_begin = end + min_length
+            max_begin = end + max_length
+            # only the silences nearest to the expected end are worth expanding
+            nearest = bisect_left(begins, expected_begin)
+            expanded = False
+            for j in range(max(nearest - _MAX_CANDIDATES, 0), min(nearest + _MAX_CANDIDATES, count)):
+                begin = begins[j]
+                # the following sentences have to fit before the last silence
+                if not min_begin < begin < max_begin or (limit is not None and ends[j] > limit):
+                    continue
+                expanded = True
+                new_cost = cost + abs(begin - expected_begin)
+                # several states may reach the same silence, only the cheapest one is kept
+                state = best.get(j)
+                if state is None or new_cost < state[0]:
+                    best[j] = (new_cost, begin, ends[j], parent)
+            if not expanded:
+                begin, synthetic_end = _synthetic_silence(end, sentence_length, average_silence_interval_length)
+                if limit is not None:
+                    begin, synthetic_end = min(begin, limit), min(synthetic_end, limit)
+                synthetic.append((cost + sentence_length, begin, synthetic_end, parent))
+        states = list(best.values()) + synthetic
+        # states that much worse than the best one won't catch up
+        max_cost = min(state[0] for state in states) + _PRUNING_RATIO * sentence_length
+        states = [state for state in states if state[0] <= max_cost]
+        if len(states) > beam_width:
+            states = nsmallest(beam_width, states, key=itemgetter(0))
+        history.append(states)
+
+    # backtracking from the cheapest final state
+    result_begins = [0] * (len(history) + 1)
+    result_ends = [0] * (len(history) + 1)
+    state = min(range(len(states)), key=lambda i: states[i][0])
+    for k in range(len(history) - 1, -1, -1):
+        _, result_begins[k + 1], result_ends[k + 1], state = history[k][state]
+    result_begins[0] = begins[0]
+    result_ends[0] = ends[0]
+    return IntervalArray(result_begins, result_ends)
@@ -0,0 +1,64 @@
+__author__ = 'emptysamurai'
+
+import argparse
+import random
+from timeit import default_timer
+import numpy as np
+import audio2subs
+from profiling import ProfileRecorder, set_recorder
+from timeinterval import IntervalArray
+
+_WORDS = ("the", "quick", "brown", "fox", "jumps", "over", "a", "lazy", "dog", "while", "people", "watch",
+          "silently", "from", "behind", "an", "old", "wooden", "fence")
+_MS_PER_POINT = 60
+_TOLERANCE = 300  # ms, sentence ends closer than this to the truth are correct
+
+
+def synthetic_recording(number_of_sentences, pauses, seed=0):
+    """Sentences, silence intervals and length of a made-up recording, with pauses silences inside every
+    sentence besides the one after it, and the true end of every sentence."""
+    generator = random.Random(seed)
+    sentences = [" ".join(generator.choice(_WORDS) for _ in range(generator.randint(4, 16))).capitalize() + "."
+                 for _ in range(number_of_sentences)]
+    begins = [0]
+    ends = [generator.uniform(300, 800)]
+    truth = []
+    time = ends[0]
+    for sentence in sentences:
+        length = audio2subs._sentence_points(sentence) * _MS_PER_POINT * generator.uniform(0.9, 1.1)
+        # short pauses between words inside the sentence
+        for offset in sorted(generator.uniform(0.1, 0.9) * length for _ in range(pauses)):
+            pause = generator.uniform(100, 300)
+            begins.append(time + offset)
+            ends.append(time + offset + pause)
+        time += length + pauses * 200
+        truth.append(time)
+        begins.append(time)
+        time += generator.uniform(300, 800)
+        ends.append(time)
+    order = np.argsort(begins)
+    return sentences, IntervalArray(np.array(begins)[order], np.array(ends)[order]), time, np.array(truth)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times sentence alignment on synthetic recordings with pauses "
+                                                 "inside sentences and measures its accuracy")
+    parser.add_argument("--sentences", type=int, default=10000, help="Number of sentences")
+    parser.add_argument("--pauses", type=int, nargs="+", default=[0, 1, 2, 3, 4],
+                        help="Numbers of pauses inside every sentence to try")
+    args = parser.parse_args()
+
+    for pauses in args.pauses:
+        sentences, intervals, length, truth = synthetic_recording(args.sentences, pauses)
+        recorder = ProfileRecorder()
+        set_recorder(recorder)
+        start = default_timer()
+        subtitles = audio2subs.align_sentences(intervals, length, sentences)
+        elapsed = default_timer() - start
+        set_recorder(None)
+        align_time = sum(stage["time"] for stage in recorder.stages() if stage["name"] == "alignment.align")
+        ends = np.array([element.interval.end for element in subtitles.elements])
+        correct = np.mean(np.abs(ends - truth) < _TOLERANCE)
+        print("%d sentences, %d pauses inside each, %d silences: %.2f s (align %.2f s), "
+              "%.1f%% of ends within %d ms" % (args.sentences, pauses, len(intervals), elapsed, align_time,
+                                               100 * correct, _TOLERANCE))
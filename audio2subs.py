@@ -1,11 +1,16 @@
 import argparse
 import re
 from vad import get_silence_intervals
+from audiosource import WaveSource
 from subrip import SubRip
 from pathlib import PurePath
-from timeinterval import TimeInterval
-import wave
+from timeinterval import TimeInterval, IntervalArray
+from alignment import align
+from vadcache import VadCache
+from profiling import ProfileRecorder, set_recorder, span
 import sys
+import numpy as np
+from difflib import SequenceMatcher
 from num2words import num2words
 
 
@@ -40,6 +45,136 @@ def _replace_numbers(string):
     string = string.replace("$", "dollars")
     return re.sub(r"\d+", lambda n: num2words(int(n.group(0))), string)
 
+
+def split_sentences(text):
+    pattern = r"((\d+|(\S(.|\n)+?))(…|\.+|[!?]|$))(?=\s+|$|\n+)"  # divide in sentences
+    sentences = re.findall(pattern, text)
+    for i, sentence in enumerate(sentences):
+        if isinstance(sentence, tuple):
+            sentences[i] = sentence[0]
+    return sentences
+
+
+def audio_length(audio_path):
+    with WaveSource(audio_path) as audio:
+        return audio.getnframes() / audio.getframerate() * 1000
+
+
+def _boundaries_length(intervals, count):
+    # pauses inside sentences are part of their speech, sentences are assumed to end at the longest silences
+    lengths = intervals.length
+    if count < len(lengths):
+        lengths = np.partition(lengths, len(lengths) - count)[len(lengths) - count:]
+    return lengths.sum()
+
+
+def align_sentences(intervals, length, sentences):
+    with span("audio2subs.sentence_points", sentences=len(sentences)):
+        sentences_points = [_sentence_points(sentence) for sentence in sentences]
+    average_silence_interval_length = intervals.length.sum() / len(intervals)
+    length -= _boundaries_length(intervals, len(sentences) + 1)
+    average_speed = length / sum(sentences_points)
+    sentences_lengths = [average_speed * sentence_points for sentence_points in sentences_points]
+    with span("alignment.align", silences=len(intervals), sentences=len(sentences)):
+        intervals = align(intervals, sentences_lengths, average_silence_interval_length)
+
+    # create SubRip
+    speech_intervals = IntervalArray.between(intervals[:-1], intervals[1:])
+    return SubRip(speech_intervals, sentences)
+
+
+def _split_sentences(text):
+    with span("audio2subs.split_sentences") as splitting:
+        sentences = split_sentences(text)
+        splitting.count("sentences", len(sentences))
+    return sentences
+
+
+def make_subtitles(audio_path, text, workers=1, cache=None, channel=None):
+    sentences = _split_sentences(text)
+    if cache is None:
+        intervals = get_silence_intervals(audio_path, workers=workers, channel=channel)
+    else:
+        intervals = cache.get_silence_intervals(audio_path, workers=workers, channel=channel)
+    return align_sentences(intervals, audio_length(audio_path), sentences)
+
+
+def _normalize_sentence(sentence):
+    return " ".join(sentence.split())
+
+
+def _align_span(intervals, begin, end, sentences):
+    # aligns sentences between two fixed cues using only the silences inside the span,
+    # silences the fixed cues border on become the first and the last ones
+    first = TimeInterval(begin, max([begin] + intervals.ends[intervals.contains(begin)].tolist()))
+    last = TimeInterval(min([end] + intervals.begins[intervals.contains(end)].tolist()), end)
+    if first.end >= last.begin:
+        # nothing but silence between the cues, sentences share all of it
+        first, last = TimeInterval(begin, begin), TimeInterval(end, end)
+    inside = intervals[(intervals.begins > first.end) & (intervals.ends < last.begin)]
+    sentences_points = [_sentence_points(sentence) for sentence in sentences]
+    average_silence_interval_length = inside.length.sum() / len(inside) if len(inside) else 0
+    speech_length = last.begin - first.end - _boundaries_length(inside, len(sentences) - 1)
+    average_speed = speech_length / max(sum(sentences_points), 1)
+    sentences_lengths = [average_speed * sentence_points for sentence_points in sentences_points]
+    silences = IntervalArray(np.concatenate(([first.begin], inside.begins)), np.concatenate(([first.end], inside.ends)))
+    boundaries = align(silences, sentences_lengths, average_silence_interval_length, last_silence=last)
+    return IntervalArray.between(boundaries[:-1], boundaries[1:])
+
+
+def realign_sentences(previous, intervals, length, sentences):
+    """Updates previous subtitles to new sentences re-aligning only what has changed.
+
+    Cues of unchanged sentences keep their timings, sentences in between are aligned only within
+    the time between the nearest unchanged cues.
+    """
+    old_sentences = [_normalize_sentence(element.text) for element in previous.elements]
+    new_sentences = [_normalize_sentence(sentence) for sentence in sentences]
+    with span("audio2subs.match_sentences", sentences=len(sentences)):
+        opcodes = SequenceMatcher(None, old_sentences, new_sentences, autojunk=False).get_opcodes()
+    begins = []
+    ends = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            for element in previous.elements[i1:i2]:
+                begins.append(element.interval.begin)
+                ends.append(element.interval.end)
+        elif j2 > j1:
+            span_begin = previous.elements[i1 - 1].interval.end if i1 > 0 else 0
+            span_end = previous.elements[i2].interval.begin if i2 < len(previous.elements) else length
+            with span("alignment.align_span", sentences=j2 - j1):
+                aligned = _align_span(intervals, span_begin, span_end, sentences[j1:j2])
+            begins.extend(aligned.begins.tolist())
+            ends.extend(aligned.ends.tolist())
+    return SubRip(IntervalArray(begins, ends), sentences)
+
+
+def remake_subtitles(audio_path, text, previous, workers=1, cache=None, channel=None):
+    sentences = _split_sentences(text)
+    if cache is None:
+        intervals = get_silence_intervals(audio_path, workers=workers, channel=channel)
+    else:
+        intervals = cache.get_silence_intervals(audio_path, workers=workers, channel=channel)
+    return realign_sentences(previous, intervals, audio_length(audio_path), sentences)
+
+
+def default_subtitles_path(audio_path):
+    return str(PurePath(audio_path).with_suffix(".srt"))
+
+
+def _channel(value):
+    return value if value == "each" else int(value)
+
+
+def _report_profile(recorder, json_path, trace_path):
+    for line in recorder.breakdown():
+        print(line)
+    if json_path is not None:
+        recorder.write_json(json_path)
+    if trace_path is not None:
+        recorder.write_chrome_trace(trace_path)
+
+
 if __name__ == "__main__":
 
     # parse arguments
@@ -48,77 +183,56 @@ if __name__ == "__main__":
     parser.add_argument("audio_path", help="Path to the audio wave file")
     parser.add_argument("text", help="Text or path to the text file")
     parser.add_argument("subtitles_path", nargs='?', help="Path to save subtitles")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes for voice activity detection, 0 for all cores")
+    parser.add_argument("--no-cache", action="store_true", help="Don't reuse or save voice activity detection results")
+    parser.add_argument("--cache-dir", help="Directory of voice activity detection cache")
+    parser.add_argument("--previous", help="Subtitles of the previous version of the text to re-align incrementally")
+    parser.add_argument("--channel", type=_channel,
+                        help="Channel of the audio to detect speech in, \"each\" to detect it in every channel "
+                             "independently, all channels are mixed by default")
+    parser.add_argument("--profile", action="store_true", help="Print the time spent in every stage")
+    parser.add_argument("--profile-json", help="Save timings of the stages as JSON, implies --profile")
+    parser.add_argument("--profile-trace", help="Save timings of the stages as a Chrome trace (chrome://tracing, "
+                                                "Perfetto), implies --profile")
     args = parser.parse_args()
 
+    recorder = None
+    if args.profile or args.profile_json is not None or args.profile_trace is not None:
+        recorder = ProfileRecorder()
+        set_recorder(recorder)
+
     try:
-        with open(args.text) as content_file:
+        with span("audio2subs.read_text"), open(args.text) as content_file:
             text = content_file.read()
     except Exception as err:
         print(str(err))
         sys.exit(1)
 
-    # process text
-    pattern = r"((\d+|(\S(.|\n)+?))(…|\.+|[!?]|$))(?=\s+|$|\n+)"  # divide in sentences
-    sentences = re.findall(pattern, text)
-    for i, sentence in enumerate(sentences):
-        if isinstance(sentence, tuple):
-            sentences[i] = sentence[0]
-    number_of_sentences = len(sentences)
-
-    # select intervals
     try:
-        intervals = get_silence_intervals(args.audio_path)
+        cache = None if args.no_cache else VadCache(args.cache_dir)
+        if args.previous is not None:
+            with span("subrip.parse"), open(args.previous) as f:
+                previous = SubRip.from_elements(SubRip.iterparse(f))
+            subtitles = remake_subtitles(args.audio_path, text, previous, workers=args.workers or None, cache=cache,
+                                         channel=args.channel)
+        else:
+            subtitles = make_subtitles(args.audio_path, text, workers=args.workers or None, cache=cache,
+                                       channel=args.channel)
     except Exception as err:
         print(str(err))
         sys.exit(1)
 
-    number_of_intervals = number_of_sentences + 1
-    audio = wave.open(args.audio_path, 'rb')
-    audio_length = audio.getnframes() / audio.getframerate() / audio.getnchannels() * 1000
-
-    sentences_points = [_sentence_points(sentence) for sentence in sentences]
-    silence_intervals_length = sum(interval.length for interval in intervals)
-    average_silence_interval_length = silence_intervals_length / len(intervals)
-    audio_length -= silence_intervals_length
-    average_speed = audio_length / sum(sentences_points)
-    sentences_lengths = [average_speed * sentence_points for sentence_points in sentences_points]
-    time_sorted_intervals = sorted(intervals, key=lambda interval: interval.begin)
-    result_intervals = [time_sorted_intervals[0]]
-    for sentence_length in sentences_lengths:
-        min_sentence_length = sentence_length * 0.5
-        max_sentence_length = sentence_length * 1.8
-        longest_interval = None
-        previous_interval = result_intervals[-1]
-        for interval in time_sorted_intervals:
-            if interval.is_later(previous_interval.end):
-                sentence_interval_length = TimeInterval.between(previous_interval, interval).length
-                if min_sentence_length < sentence_interval_length < max_sentence_length:
-                    if longest_interval is None or longest_interval.length < interval.length:
-                        longest_interval = interval
-                elif sentence_interval_length >= max_sentence_length:
-                    break
-        if longest_interval is None:
-            end = previous_interval.end + sentence_length
-            if sentence_length > average_silence_interval_length:
-                result_intervals.append(TimeInterval(end - average_silence_interval_length, end))
-            else:
-                result_intervals.append(TimeInterval(end - sentence_length / 2.5, end))
-        else:
-            result_intervals.append(longest_interval)
-    intervals = result_intervals
-
-    # create SubRip
-    speech_intervals = [None] * (len(intervals) - 1)
-    for i in range(len(intervals) - 1):
-        speech_intervals[i] = TimeInterval.between(intervals[i], intervals[i + 1])
-    subtitles = SubRip(speech_intervals, sentences)
     try:
         if args.subtitles_path is not None:
             path_to_subs = args.subtitles_path
         else:
-            path_to_subs = PurePath(args.audio_path).with_suffix(".srt")
-        with open(str(path_to_subs), 'w') as f:
-            f.write(str(subtitles))
+            path_to_subs = default_subtitles_path(args.audio_path)
+        with span("subrip.write", cues=len(subtitles.elements)):
+            subtitles.write(path_to_subs)
     except Exception as err:
         print(str(err))
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+    if recorder is not None:
+        _report_profile(recorder, args.profile_json, args.profile_trace)
@@ -0,0 +1,113 @@
+__author__ = 'emptysamurai'
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePath
+from timeit import default_timer
+from audio2subs import make_subtitles, audio_length, default_subtitles_path
+from vadcache import VadCache
+
+
+def _directory_pairs(directory):
+    # every wave file with a text file of the same name
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if PurePath(name).suffix.lower() == ".wav":
+            text_path = str(PurePath(path).with_suffix(".txt"))
+            if os.path.isfile(text_path):
+                yield {"audio": path, "text": text_path}
+
+
+def _manifest_pairs(manifest):
+    # relative paths in a manifest are relative to the manifest itself
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline="") as f:
+        if PurePath(manifest).suffix.lower() == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for row in rows:
+        pair = {"audio": os.path.join(base, row["audio"]), "text": os.path.join(base, row["text"])}
+        if row.get("subtitles"):
+            pair["subtitles"] = os.path.join(base, row["subtitles"])
+        yield pair
+
+
+def _subtitles_path(pair, output_directory):
+    if "subtitles" in pair:
+        return pair["subtitles"]
+    elif output_directory is not None:
+        return os.path.join(output_directory, PurePath(pair["audio"]).with_suffix(".srt").name)
+    else:
+        return default_subtitles_path(pair["audio"])
+
+
+def _up_to_date(pair):
+    try:
+        subtitles_time = os.path.getmtime(pair["subtitles"])
+    except OSError:
+        return False
+    return subtitles_time >= max(os.path.getmtime(pair["audio"]), os.path.getmtime(pair["text"]))
+
+
+def _process(pair, use_cache, cache_directory):
+    start = default_timer()
+    try:
+        with open(pair["text"]) as f:
+            text = f.read()
+        cache = VadCache(cache_directory) if use_cache else None
+        subtitles = make_subtitles(pair["audio"], text, cache=cache)
+        subtitles.write(pair["subtitles"])
+        error = None
+    except Exception as err:
+        error = str(err)
+    duration = audio_length(pair["audio"]) / 1000 if error is None else None
+    return pair, default_timer() - start, duration, error
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates SubRip (srt) subtitles for many audio files with speech and text")
+    parser.add_argument("input", help="Directory with .wav and .txt files of the same names or a CSV/JSONL manifest "
+                                      "with audio, text and optional subtitles columns")
+    parser.add_argument("--output-dir", help="Directory to save subtitles, next to the audio by default")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Number of files processed at once")
+    parser.add_argument("--force", action="store_true", help="Process files with up to date subtitles too")
+    parser.add_argument("--no-cache", action="store_true", help="Don't reuse or save voice activity detection results")
+    parser.add_argument("--cache-dir", help="Directory of voice activity detection cache")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.input):
+        pairs = list(_directory_pairs(args.input))
+    else:
+        pairs = list(_manifest_pairs(args.input))
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for pair in pairs:
+        pair["subtitles"] = _subtitles_path(pair, args.output_dir)
+
+    skipped = [pair for pair in pairs if not args.force and _up_to_date(pair)]
+    pairs = [pair for pair in pairs if args.force or not _up_to_date(pair)]
+    print("%d files to process, %d up to date" % (len(pairs), len(skipped)))
+
+    start = default_timer()
+    failed = 0
+    total_duration = 0
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        results = executor.map(_process, pairs, [not args.no_cache] * len(pairs), [args.cache_dir] * len(pairs))
+        for pair, wall_time, duration, error in results:
+            if error is not None:
+                failed += 1
+                print("%s: failed: %s" % (pair["audio"], error))
+            else:
+                total_duration += duration
+                print("%s: %.2f s for %.1f s of audio, real-time factor %.4f" %
+                      (pair["audio"], wall_time, duration, wall_time / duration))
+    wall_time = default_timer() - start
+    print("Processed %d files (%d failed) in %.2f s, %.1f s of audio, real-time factor %.4f" %
+          (len(pairs), failed, wall_time, total_duration, wall_time / total_duration if total_duration else 0))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,117 @@
+__author__ = 'emptysamurai'
+
+import time
+import wave
+from abc import ABC, abstractmethod
+from timeit import default_timer
+
+
+class AudioOutput(ABC):
+    """Where the player writes interleaved PCM frames to.
+
+    configure() is called for every opened audio before any write(), data is little endian and 8bit
+    data is unsigned as in wave files.
+    """
+
+    @abstractmethod
+    def configure(self, channels, sample_rate, sample_width, period_frames):
+        pass
+
+    @abstractmethod
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class AlsaOutput(AudioOutput):
+    """Default ALSA sound device, write() blocks while the device buffer is full."""
+
+    def __init__(self):
+        import alsaaudio
+        self._alsaaudio = alsaaudio
+        self._device = alsaaudio.PCM()
+
+    def configure(self, channels, sample_rate, sample_width, period_frames):
+        formats = {1: self._alsaaudio.PCM_FORMAT_U8, 2: self._alsaaudio.PCM_FORMAT_S16_LE,
+                   3: self._alsaaudio.PCM_FORMAT_S24_LE, 4: self._alsaaudio.PCM_FORMAT_S32_LE}
+        if sample_width not in formats:
+            raise ValueError('Unsupported format')
+        self._device.setchannels(channels)
+        self._device.setrate(sample_rate)
+        self._device.setformat(formats[sample_width])
+        self._device.setperiodsize(period_frames)
+
+    def write(self, data):
+        self._device.write(data)
+
+    def close(self):
+        self._device.close()
+
+
+class NullOutput(AudioOutput):
+    """Discards audio, pacing write() to real time like a sound device.
+
+    With realtime False audio is consumed as fast as it is written, for benchmarks.
+    """
+
+    def __init__(self, realtime=True):
+        self._realtime = realtime
+        self._frame_width = 1
+        self._sample_rate = 1
+        self._start = None
+        self._written = 0
+
+    @property
+    def written_frames(self):
+        return self._written
+
+    def configure(self, channels, sample_rate, sample_width, period_frames):
+        self._frame_width = channels * sample_width
+        self._sample_rate = sample_rate
+        self._start = None
+        self._written = 0
+
+    def write(self, data):
+        self._written += len(data) // self._frame_width
+        if not self._realtime:
+            return
+        now = default_timer()
+        if self._start is None:
+            self._start = now
+        delay = self._start + self._written / self._sample_rate - now
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay * self._sample_rate > len(data) // self._frame_width:
+            # playback was paused or stalled, real time starts over from here
+            self._start = now - self._written / self._sample_rate
+
+
+class FileOutput(AudioOutput):
+    """Records audio to a wave file, or to a file of raw frames when the path doesn't end with .wav."""
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+
+    def configure(self, channels, sample_rate, sample_width, period_frames):
+        self.close()
+        if self._path.lower().endswith(".wav"):
+            self._file = wave.open(self._path, "wb")
+            self._file.setnchannels(channels)
+            self._file.setsampwidth(sample_width)
+            self._file.setframerate(sample_rate)
+        else:
+            self._file = open(self._path, "wb")
+
+    def write(self, data):
+        if isinstance(self._file, wave.Wave_write):
+            self._file.writeframesraw(data)
+        else:
+            self._file.write(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,200 @@
+__author__ = 'emptysamurai'
+
+import os
+import struct
+import wave
+import numpy as np
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def bytes_to_samples(samples_bytes, sample_width):
+    """Decodes little-endian PCM data into signed samples without going through python objects.
+
+    16 and 32-bit data is returned as a view of the given buffer, 8-bit data (unsigned in wav files)
+    is shifted to int16 and 24-bit data is sign-extended to int32.
+    """
+    if sample_width == 2:
+        return np.frombuffer(samples_bytes, dtype="<i2")
+    elif sample_width == 4:
+        return np.frombuffer(samples_bytes, dtype="<i4")
+    elif sample_width == 1:
+        return np.frombuffer(samples_bytes, dtype=np.uint8).astype(np.int16) - 128
+    elif sample_width == 3:
+        packed = np.frombuffer(samples_bytes, dtype=np.uint8)
+        length = len(packed) // 3
+        samples = np.zeros(length, dtype="<i4")
+        samples.view(np.uint8).reshape(length, 4)[:, 1:] = packed[:length * 3].reshape(length, 3)
+        samples >>= 8
+        return samples
+    else:
+        raise ValueError("Can't read " + str(sample_width) + "-byte audio")
+
+
+def to_mono(samples, channels):
+    """Averages interleaved samples of all the channels."""
+    if channels == 1:
+        return samples
+    frames = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    # adding the columns is several times faster than mean along the short axis
+    mono = frames[:, 0].astype(np.float64)
+    for channel in range(1, channels):
+        mono += frames[:, channel]
+    mono /= channels
+    return mono
+
+
+def select_channels(samples, channels, channel=None):
+    """Interleaved samples of all the channels mixed when channel is None, of the channel with the given
+    index, or of every channel as columns of a 2-D array when channel is "each"."""
+    if channel is None:
+        return to_mono(samples, channels)
+    frames = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    if channel == "each":
+        return frames
+    if not 0 <= channel < channels:
+        raise ValueError("Audio has no channel " + str(channel))
+    return frames[:, channel]
+
+
+class WaveSource:
+    """Memory-mapped PCM wave file with the reading interface of wave.Wave_read.
+
+    Samples are returned as numpy arrays backed by the mapping, so reading a block costs no copies
+    and memory use doesn't depend on the size of the file.
+    """
+
+    def __init__(self, path):
+        self._channels, self._sample_rate, self._sample_width, offset, size = self._parse_header(path)
+        self._frame_width = self._channels * self._sample_width
+        self._number_of_frames = size // self._frame_width
+        if self._number_of_frames == 0:
+            self._data = np.empty(0, dtype=np.uint8)
+        else:
+            self._data = np.memmap(path, dtype=np.uint8, mode="r", offset=offset,
+                                   shape=(self._number_of_frames * self._frame_width,))
+        self._position = 0
+
+    @staticmethod
+    def _parse_header(path):
+        file_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave_id != b"WAVE":
+                raise ValueError("File " + str(path) + " is not a wave file")
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError("Wave file " + str(path) + " has no data chunk")
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = struct.unpack("<HHIIHH", f.read(16))
+                    f.seek(chunk_size - 16 + chunk_size % 2, os.SEEK_CUR)
+                elif chunk_id == b"data":
+                    if fmt is None:
+                        raise ValueError("Wave file " + str(path) + " has data chunk before fmt chunk")
+                    offset = f.tell()
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+        format_tag, channels, sample_rate, _, _, bits_per_sample = fmt
+        if format_tag not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_EXTENSIBLE):
+            raise ValueError("Unsupported wave format " + str(format_tag))
+        sample_width = (bits_per_sample + 7) // 8
+        # streamed files may carry a placeholder size, so never trust it beyond the end of file
+        size = min(chunk_size, file_size - offset)
+        return channels, sample_rate, sample_width, offset, size
+
+    def getnchannels(self):
+        return self._channels
+
+    def getsampwidth(self):
+        return self._sample_width
+
+    def getframerate(self):
+        return self._sample_rate
+
+    def getnframes(self):
+        return self._number_of_frames
+
+    def tell(self):
+        return self._position
+
+    def setpos(self, pos):
+        if not 0 <= pos <= self._number_of_frames:
+            raise ValueError("Position is out of range")
+        self._position = pos
+
+    def rewind(self):
+        self._position = 0
+
+    def samples(self, start=0, stop=None):
+        """Interleaved samples of the wave frames from start to stop."""
+        return bytes_to_samples(self.frames(start, stop), self._sample_width)
+
+    def frames(self, start=0, stop=None):
+        """Raw bytes of the wave frames from start to stop as a view of the mapping."""
+        if stop is None or stop > self._number_of_frames:
+            stop = self._number_of_frames
+        start = min(start, stop)
+        return self._data[start * self._frame_width:stop * self._frame_width]
+
+    def readframes(self, n):
+        """Interleaved samples of the next n wave frames."""
+        start = self._position
+        self._position = min(start + n, self._number_of_frames)
+        return self.samples(start, self._position)
+
+    def close(self):
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class WaveStream:
+    """Wave file read sequentially from a file object, for sources that can't be memory-mapped."""
+
+    def __init__(self, file):
+        self._audio = wave.open(file, "rb")
+
+    def getnchannels(self):
+        return self._audio.getnchannels()
+
+    def getsampwidth(self):
+        return self._audio.getsampwidth()
+
+    def getframerate(self):
+        return self._audio.getframerate()
+
+    def getnframes(self):
+        return self._audio.getnframes()
+
+    def tell(self):
+        return self._audio.tell()
+
+    def readframes(self, n):
+        """Interleaved samples of the next n wave frames."""
+        return bytes_to_samples(self._audio.readframes(n), self._audio.getsampwidth())
+
+    def close(self):
+        self._audio.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_source(source):
+    """Opens a path with WaveSource and a file object with WaveStream."""
+    if hasattr(source, "read"):
+        return WaveStream(source)
+    return WaveSource(source)
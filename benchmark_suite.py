@@ -0,0 +1,226 @@
+__author__ = 'emptysamurai'
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer
+import numpy as np
+import audio2subs
+import lsfm_vad
+import simple_vad
+import vad
+
+_STAGES = ("vad", "simple_vad", "lsfm_vad", "alignment")
+# every case differs from the reference in one parameter unless the full matrix is asked for
+_REFERENCE = {"duration": 60, "sample_rate": 16000, "sample_width": 2, "channels": 1}
+_DURATIONS = (60, 600)
+_SAMPLE_RATES = (8000, 16000, 44100, 48000)
+_SAMPLE_WIDTHS = (1, 2, 3, 4)
+_CHANNELS = (1, 2)
+_BURST_PERIOD = 5  # s, half of it is a tone burst
+_FRAME_LENGTH = 10  # ms, frames per second are counted in these
+_TOLERANCE = 0.2
+# smaller growth is timer and allocator noise however large the share
+_NOISE = {"time": 0.005, "peak_rss": 2 ** 20}  # s, bytes
+_PARAMETERS = ("duration", "sample_rate", "sample_width", "channels")
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def write_synthetic_wav(path, duration, sample_rate, sample_width=2, channels=1):
+    """Writes speech-like tone bursts in noise, the same for the same arguments and in every channel.
+
+    Audio is generated in one minute pieces, so any duration fits in memory.
+    """
+    random = np.random.RandomState(0)
+    audio = wave.open(path, "wb")
+    audio.setnchannels(channels)
+    audio.setsampwidth(sample_width)
+    audio.setframerate(sample_rate)
+    piece = 60 * sample_rate
+    length = int(duration * sample_rate)
+    # full scale of the sample width in units of 16-bit samples
+    scale = 2 ** (8 * sample_width - 16)
+    for start in range(0, length, piece):
+        end = min(start + piece, length)
+        t = np.arange(start, end) / sample_rate
+        samples = random.normal(0, 300, end - start)
+        speech = t % _BURST_PERIOD > _BURST_PERIOD / 2
+        samples += speech * 8000 * np.sin(2 * np.pi * 440 * t)
+        samples = np.repeat(np.clip(samples, -32768, 32767) * scale, channels)
+        if sample_width == 1:
+            data = (samples + 128).astype(np.uint8).tobytes()
+        elif sample_width == 3:
+            data = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        else:
+            data = samples.astype("<i" + str(sample_width)).tobytes()
+        audio.writeframes(data)
+    audio.close()
+
+
+def synthetic_text(duration):
+    """One sentence for every tone burst of synthetic audio of the duration, with numbers in some."""
+    bursts = int(-(-duration // _BURST_PERIOD))
+    return " ".join("Sentence %d has a few words in it." % i if i % 3 == 0 else
+                    "This is a sentence without numbers." for i in range(bursts))
+
+
+def _cases(matrix):
+    if matrix:
+        for values in itertools.product(_DURATIONS, _SAMPLE_RATES, _SAMPLE_WIDTHS, _CHANNELS):
+            yield dict(zip(_PARAMETERS, values))
+        return
+    yield dict(_REFERENCE)
+    for name, values in zip(_PARAMETERS, (_DURATIONS, _SAMPLE_RATES, _SAMPLE_WIDTHS, _CHANNELS)):
+        for value in values:
+            if value != _REFERENCE[name]:
+                case = dict(_REFERENCE)
+                case[name] = value
+                yield case
+
+
+def _peak_rss():
+    # on Linux ru_maxrss survives exec and starts at the peak of the parent, VmHWM is of this process alone
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+def _run_stage(stage, path, repeat, intervals, text):
+    # runs in a fresh process, so the peak resident set size is of this stage alone
+    if stage == "alignment":
+        length = audio2subs.audio_length(path)
+        function = lambda: audio2subs.align_sentences(intervals, length, audio2subs.split_sentences(text))
+    else:
+        engine = {"vad": vad, "simple_vad": simple_vad, "lsfm_vad": lsfm_vad}[stage]
+        function = lambda: engine.get_silence_intervals(path)
+    baseline_rss = _peak_rss()
+    times = []
+    for i in range(repeat):
+        start = default_timer()
+        function()
+        times.append(default_timer() - start)
+    return times, baseline_rss, _peak_rss()
+
+
+def run(stages=_STAGES, matrix=False, repeat=3, log=None):
+    """Runs every stage on synthetic audio of every case and returns the report."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for case in _cases(matrix):
+            path = os.path.join(directory, "synthetic.wav")
+            write_synthetic_wav(path, case["duration"], case["sample_rate"], case["sample_width"], case["channels"])
+            intervals = vad.get_silence_intervals(path) if "alignment" in stages else None
+            text = synthetic_text(case["duration"])
+            for stage in stages:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    times, baseline_rss, peak_rss = executor.submit(_run_stage, stage, path, repeat, intervals,
+                                                                    text).result()
+                time = min(times)
+                result = dict(case, stage=stage, time=time, times=times,
+                              real_time_factor=time / case["duration"],
+                              frames_per_second=case["duration"] * 1000 / _FRAME_LENGTH / time,
+                              peak_rss=peak_rss, baseline_rss=baseline_rss)
+                results.append(result)
+                if log is not None:
+                    log(result)
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "processor": platform.processor(), "cpu_count": os.cpu_count(), "repeat": repeat, "results": results}
+
+
+def _key(result):
+    return (result["stage"],) + tuple(result[name] for name in _PARAMETERS)
+
+
+def _describe(result):
+    return "%s %d s %d Hz %d-bit %d ch" % (result["stage"], result["duration"], result["sample_rate"],
+                                          8 * result["sample_width"], result["channels"])
+
+
+def compare(baseline, current, tolerance=_TOLERANCE):
+    """Regressions of the current report against the baseline: (case, measure, baseline, current) for
+    every time and peak memory more than tolerance and noise above the baseline, and cases of the baseline missing
+    from the current report."""
+    baseline_results = {_key(result): result for result in baseline["results"]}
+    current_results = {_key(result): result for result in current["results"]}
+    regressions = []
+    for key, result in current_results.items():
+        if key not in baseline_results:
+            continue
+        previous = baseline_results[key]
+        for measure in ("time", "peak_rss"):
+            if (result[measure] > previous[measure] * (1 + tolerance) and
+                    result[measure] - previous[measure] > _NOISE[measure]):
+                regressions.append((_describe(result), measure, previous[measure], result[measure]))
+    missing = [_describe(result) for key, result in baseline_results.items() if key not in current_results]
+    return regressions, missing
+
+
+def _print_result(result):
+    print("%-32s %8.3f s  RTF %.4f  %10.0f frames/s  peak RSS %.1f MB" %
+          (_describe(result), result["time"], result["real_time_factor"], result["frames_per_second"],
+           result["peak_rss"] / 2 ** 20), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks VAD engines and alignment on deterministic synthetic "
+                                                 "audio and compares the results with a baseline")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and write a JSON report")
+    run_parser.add_argument("--output", help="Path to save the JSON report, standard output by default")
+    run_parser.add_argument("--stages", nargs="+", choices=_STAGES, default=list(_STAGES), help="Stages to run")
+    run_parser.add_argument("--matrix", action="store_true",
+                            help="Run every combination of durations, sample rates, bit depths and channel "
+                                 "counts instead of varying one at a time")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Runs of every case, the fastest one counts")
+    run_parser.add_argument("--baseline", help="JSON report to compare the results with")
+    run_parser.add_argument("--tolerance", type=float, default=_TOLERANCE,
+                            help="Share of the baseline a measure may grow by before it is a regression")
+    compare_parser = subparsers.add_parser("compare", help="Compare a JSON report with a baseline")
+    compare_parser.add_argument("baseline", help="JSON report of the baseline")
+    compare_parser.add_argument("current", help="JSON report to check")
+    compare_parser.add_argument("--tolerance", type=float, default=_TOLERANCE,
+                                help="Share of the baseline a measure may grow by before it is a regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.stages, args.matrix, args.repeat, log=_print_result)
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        if args.baseline is None:
+            sys.exit(0)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            report = json.load(f)
+
+    regressions, missing = compare(baseline, report, args.tolerance)
+    for case in missing:
+        print("%s: missing from the report" % case, file=sys.stderr)
+    for case, measure, previous, current in regressions:
+        print("%s: %s regressed from %.4g to %.4g (%+.0f%%)" %
+              (case, measure, previous, current, (current / previous - 1) * 100), file=sys.stderr)
+    print("%d regressions" % len(regressions), file=sys.stderr)
+    sys.exit(1 if regressions else 0)
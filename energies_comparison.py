@@ -3,18 +3,8 @@ __author__ = 'emptysamurai'
 import matplotlib.pyplot as plt
 import numpy as np
 import argparse
-import wave
+from features import FeatureBank
 import vad
-from scipy.io.wavfile import read
-
-def _time_in_interval(ms, intervals):
-    for interval in intervals:
-        if interval.contains(ms):
-            return True
-    return False
-
-def _short_time_energy(frame, sample_rate):
-    return sum(x ** 2 for x in frame)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -24,19 +14,18 @@ if __name__ == "__main__":
     step = 10
 
     path_to_file = args.audio_path
-    (sample_rate, samples) = read(path_to_file)
-    audio = wave.open(path_to_file, "rb")
-    sample_rate = audio.getframerate()
-    channels = audio.getnchannels()
-    number_of_samples = audio.getnframes()
-    duration = int(number_of_samples / channels / sample_rate * 1000)
-
-    my_vad_intervals = vad.get_silence_intervals(path_to_file)
-    vad._voice_frequency_energy = _short_time_energy
-    energy_vad_intervals = vad.get_silence_intervals(path_to_file)
-
-    my_vad_decisions = np.array([not _time_in_interval(t, my_vad_intervals) for t in range(0, duration, step)])
-    energy_vad_decisions = np.array([not _time_in_interval(t, energy_vad_intervals) for t in range(0, duration, step)])
+    # vad analyzes files at their own rate, as without a bank
+    bank = FeatureBank(path_to_file)
+    samples = bank.samples
+    sample_rate = bank.sample_rate
+    duration = int(len(samples) / sample_rate * 1000)
+
+    # the same decisions on voice frequency energies and on energies of all frequencies
+    my_vad_intervals = vad.get_silence_intervals(path_to_file, bank=bank)
+    energy_vad_intervals = vad.energies_to_silence_intervals(bank.energies)
+
+    my_vad_decisions = ~my_vad_intervals.covers(np.arange(0, duration, step))
+    energy_vad_decisions = ~energy_vad_intervals.covers(np.arange(0, duration, step))
 
     fig, axarr = plt.subplots(3, sharex=True, **{"num": "Energies comparison", "dpi": 150})
 
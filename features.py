@@ -0,0 +1,224 @@
+__author__ = 'emptysamurai'
+
+import math
+import numpy as np
+from audiosource import WaveSource, select_channels
+from profiling import span
+from resampling import Decimator
+
+_BLOCK_FRAMES = 2048
+_RESAMPLE_BLOCK = 1 << 20
+_PASSBAND = 0.8  # share of the nyquist frequency kept by resampling unless told otherwise
+
+
+def hz_to_index(hz, length, sample_rate):
+    return round(hz * length / sample_rate)
+
+
+def index_to_hz(index, length, sample_rate):
+    return index * sample_rate / length
+
+
+def band_mask(low, high, length, sample_rate):
+    """Mask of the rfft bins of frames of length samples from low to high Hz."""
+    start_index = hz_to_index(low, length, sample_rate)
+    end_index = hz_to_index(high, length, sample_rate)
+    upper_bound = length // 2 + 1
+    mask = np.zeros(upper_bound, dtype=bool)
+    mask[min(start_index, upper_bound - 1):min(end_index + 1, upper_bound)] = True
+    return mask
+
+
+def to_frames(samples, number_of_frames, samples_per_frame):
+    """Frames of mono samples, or of samples with a column per channel as (frames, channels, samples)."""
+    frames = samples[:number_of_frames * samples_per_frame].reshape((number_of_frames, samples_per_frame) +
+                                                                   samples.shape[1:])
+    if frames.ndim == 2:
+        return frames
+    # the fft is much faster on frames that are contiguous
+    return np.ascontiguousarray(np.moveaxis(frames, 1, -1))
+
+
+def short_time_energies(frames):
+    return np.einsum("...i,...i->...", frames, frames, dtype=np.float64)
+
+
+def power_spectra(frames):
+    fft_frames = np.fft.rfft(frames, axis=-1)
+    return fft_frames.real ** 2 + fft_frames.imag ** 2
+
+
+def band_energies(powers, mask):
+    return np.sum(powers[..., mask], axis=-1)
+
+
+def dominant_frequencies(powers, length, sample_rate):
+    return index_to_hz(np.argmax(powers, axis=-1), length, sample_rate)
+
+
+def spectral_flatnesses(powers):
+    nonzero = powers != 0
+    length = powers.shape[-1]
+    arithmetic_means = np.sum(powers, axis=-1) / length
+    geometric_means_logarithms = np.sum(np.log(powers, where=nonzero, out=np.zeros_like(powers)), axis=-1) / length
+    positive = arithmetic_means != 0
+    logarithms = np.log10(arithmetic_means, where=positive, out=np.zeros_like(arithmetic_means))
+    return np.where(positive, 10 * (geometric_means_logarithms / math.log(10) - logarithms), 0)
+
+
+class FeatureBank:
+    """Features of the frames of one wave file, each computed on first use and kept for the next users.
+
+    The file is decoded, mixed and resampled once and every spectral feature comes from one
+    spectrogram, so any number of detectors and plots of the same file cost one decode and one STFT,
+    banks with other frames made by reframed() share the decoded samples. Audio is analyzed at
+    sample_rate, the rate of the file by default, keeping frequencies up to max_frequency when it is
+    resampled. Frames of frame_length ms start every frame_step ms, frame_length by default, and are
+    multiplied by window(samples_per_frame) before the FFT when window is given. channel selects
+    channels as in audiosource.select_channels, with "each" features have a column per channel. The
+    whole spectrogram is kept in memory.
+    """
+
+    def __init__(self, path, frame_length=10, sample_rate=None, max_frequency=None, channel=None, frame_step=None,
+                 window=None):
+        self._path = path
+        self._frame_length = frame_length
+        self._frame_step = frame_step if frame_step is not None else frame_length
+        self._window = window
+        self._channel = channel
+        audio = WaveSource(path)
+        self._file_rate = audio.getframerate()
+        self._sample_width = audio.getsampwidth()
+        audio.close()
+        self._sample_rate = sample_rate if sample_rate is not None else self._file_rate
+        if max_frequency is None:
+            max_frequency = _PASSBAND * self._sample_rate / 2
+        self._max_frequency = max_frequency
+        self._samples_per_frame = int((self._sample_rate * frame_length) / 1000)
+        self._samples_per_step = int((self._sample_rate * self._frame_step) / 1000)
+        self._samples = None
+        self._powers = None
+        self._magnitudes = None
+        self._energies = None
+        self._dominant_frequencies = None
+        self._spectral_flatnesses = None
+        self._band_energies = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def frame_length(self):
+        return self._frame_length
+
+    @property
+    def frame_step(self):
+        return self._frame_step
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @property
+    def sample_width(self):
+        return self._sample_width
+
+    @property
+    def samples_per_frame(self):
+        return self._samples_per_frame
+
+    @property
+    def samples(self):
+        """Samples of the selected channels at the analysis rate."""
+        if self._samples is None:
+            with span("features.decode"):
+                audio = WaveSource(self._path)
+                samples = select_channels(audio.samples(), audio.getnchannels(), self._channel)
+                audio.close()
+            if self._sample_rate != self._file_rate:
+                decimator = Decimator(self._file_rate, self._sample_rate, self._max_frequency)
+                blocks = (samples[i:i + _RESAMPLE_BLOCK] for i in range(0, len(samples), _RESAMPLE_BLOCK))
+                samples = np.concatenate([np.zeros((0,) + samples.shape[1:])] + list(decimator.blocks(blocks)))
+            self._samples = samples
+        return self._samples
+
+    def reframed(self, frame_length, frame_step=None, window=None):
+        """Bank of the same samples with other frames."""
+        bank = FeatureBank(self._path, frame_length, self._sample_rate, self._max_frequency, self._channel,
+                           frame_step, window)
+        bank._samples = self.samples
+        return bank
+
+    @property
+    def number_of_frames(self):
+        return max((len(self.samples) - self._samples_per_frame) // self._samples_per_step + 1, 0)
+
+    @property
+    def frames(self):
+        if self._samples_per_step == self._samples_per_frame:
+            return to_frames(self.samples, self.number_of_frames, self._samples_per_frame)
+        # overlapping frames are views of the samples, as (frames, channels, samples) for several channels
+        windows = np.lib.stride_tricks.sliding_window_view(self.samples, self._samples_per_frame, axis=0)
+        return windows[::self._samples_per_step][:self.number_of_frames]
+
+    def _spectrogram(self, transform):
+        frames = self.frames
+        window = self._window(self._samples_per_frame) if self._window is not None else None
+        with span("features.stft", frames=len(frames)):
+            result = np.empty(frames.shape[:-1] + (self._samples_per_frame // 2 + 1,))
+            for start in range(0, len(frames), _BLOCK_FRAMES):
+                block = frames[start:start + _BLOCK_FRAMES]
+                result[start:start + _BLOCK_FRAMES] = transform(block * window if window is not None else block)
+        return result
+
+    @property
+    def powers(self):
+        """Power spectrogram, a row of rfft bins for every frame."""
+        if self._powers is None:
+            self._powers = self._spectrogram(power_spectra)
+        return self._powers
+
+    @property
+    def magnitudes(self):
+        """Magnitude spectrogram."""
+        if self._magnitudes is None:
+            # only the magnitudes are kept when the powers aren't needed
+            if self._powers is not None:
+                self._magnitudes = np.sqrt(self._powers)
+            else:
+                self._magnitudes = self._spectrogram(lambda frames: np.abs(np.fft.rfft(frames, axis=-1)))
+        return self._magnitudes
+
+    @property
+    def energies(self):
+        """Short-time energies of the frames."""
+        if self._energies is None:
+            self._energies = short_time_energies(self.frames)
+        return self._energies
+
+    @property
+    def dominant_frequencies(self):
+        """Frequency of the strongest bin of every frame in Hz."""
+        if self._dominant_frequencies is None:
+            self._dominant_frequencies = dominant_frequencies(self.powers, self._samples_per_frame,
+                                                              self._sample_rate)
+        return self._dominant_frequencies
+
+    @property
+    def spectral_flatnesses(self):
+        """Spectral flatness of every frame in dB."""
+        if self._spectral_flatnesses is None:
+            self._spectral_flatnesses = spectral_flatnesses(self.powers)
+        return self._spectral_flatnesses
+
+    def band_energies(self, low, high):
+        """Energies of the frames in the frequencies from low to high Hz."""
+        if (low, high) not in self._band_energies:
+            mask = band_mask(low, high, self._samples_per_frame, self._sample_rate)
+            self._band_energies[(low, high)] = band_energies(self.powers, mask)
+        return self._band_energies[(low, high)]
@@ -2,156 +2,116 @@ __author__ = 'emptysamurai'
 
 import math
 import numpy as np
-import wave
-from scipy.io.wavfile import read
-from timeinterval import TimeInterval
+from scipy.ndimage import minimum_filter1d, maximum_filter1d
+from audiosource import WaveSource
+from features import FeatureBank, band_mask
+from postprocessing import silence_runs, to_time_intervals
+from resampling import analysis_rate
 
 #Not such a bad VAD. Implemented for comparison.
 #http://asmp.eurasipjournals.com/content/pdf/1687-4722-2013-21.pdf
 
 _R = 5
 _M = 10
-
-
-def _short_time_spectrum(frames, index, frequency):
-    start = max(0, index - _M)
-    return sum(abs(frames[i][frequency]) for i in range(start, index)) / (index - start)
-
-
-def lsfm(frames, index, sample_rate):
-    start_frequency = 500
-    last_frequency = 4000
-
-    frame_length = frames.shape[1]
-    start_frequency_index = _hz_to_index(start_frequency, frame_length, sample_rate)
-    last_frequency_index = _hz_to_index(last_frequency, frame_length, sample_rate)
-
-    result = 0
-    for i in range(start_frequency_index, last_frequency_index + 1):
-        geometric_mean = 0
-        arithmetic_mean = 0
-        start = max(0, index - _R)
-        for j in range(start, index + 1):
-            sts = _short_time_spectrum(frames, j, i)
-            if not sts == 0:
-                geometric_mean += math.log(sts)
-                arithmetic_mean += sts
-        geometric_mean = math.pow(math.exp(geometric_mean), 1 / _R)
-        arithmetic_mean /= _R
-        if not (arithmetic_mean == 0 or geometric_mean == 0):
-            result += math.log10(geometric_mean / arithmetic_mean)
+_START_FREQUENCY = 500
+_LAST_FREQUENCY = 4000
+_FRAME_LENGTH = 20  # ms
+_FRAME_STEP = 10  # ms
+
+
+def _window_sums(values, length):
+    # sums of the last length rows before every row, computed with a running sum along frames
+    running = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=running[1:])
+    return running[length:] - running[:-length]
+
+
+def lsfm(magnitudes, read_frames=2048):
+    """Long-term spectral flatness measure of frames with the given magnitude spectra, frames before _M + _R
+    are left zero."""
+    number_of_frames = len(magnitudes)
+    result = np.zeros(number_of_frames)
+    for first_frame in range(_M + _R, number_of_frames, read_frames):
+        last_frame = min(first_frame + read_frames, number_of_frames)
+        # every value needs _M + _R preceding frames
+        short_time_spectrum = _window_sums(magnitudes[first_frame - _M - _R:last_frame], _M)[:-1] / _M
+        nonzero = short_time_spectrum != 0
+        logarithms = np.log(short_time_spectrum, where=nonzero, out=np.zeros_like(short_time_spectrum))
+        geometric_mean_logarithm = _window_sums(logarithms, _R + 1) / _R
+        arithmetic_mean = _window_sums(short_time_spectrum, _R + 1) / _R
+        positive = arithmetic_mean > 0
+        flatness = np.divide(geometric_mean_logarithm, math.log(10), where=positive,
+                             out=np.zeros_like(arithmetic_mean))
+        flatness -= np.log10(arithmetic_mean, where=positive, out=np.zeros_like(arithmetic_mean))
+        result[first_frame:last_frame] = np.sum(flatness, axis=1)
     return result
 
 
-def threshold(frames, sample_rate):
+def threshold(lsfm_values):
     length = 100
     lambda_value = 0.55
 
+    number_of_frames = len(lsfm_values)
+    if number_of_frames <= _M + _R + length:
+        raise ValueError("Audio is too short for LSFM VAD")
+    # extremes of the length values ending at every frame
+    min_values = minimum_filter1d(lsfm_values, length, origin=(length - 1) // 2)
+    max_values = maximum_filter1d(lsfm_values, length, origin=(length - 1) // 2)
+
     last_speech = 0
     last_silence = _M + _R + length
-    number_of_frames = frames.shape[0]
-    lsfm_values = np.empty(number_of_frames, dtype=float)
-    result = np.empty(number_of_frames, dtype=bool)
-
-    for i in range(_M + _R):
-        result[i] = False
-
-    for i in range(_M + _R, _M + _R + length):
-        result[i] = False
-        lsfm_values[i] = lsfm(frames, i, sample_rate)
+    result = np.zeros(number_of_frames, dtype=bool)
 
+    values = lsfm_values.tolist()
+    min_values = min_values.tolist()
+    max_values = max_values.tolist()
     for i in range(_M + _R + length, number_of_frames):
-        lsfm_values[i] = lsfm(frames, i, sample_rate)
-        threshold_value = lambda_value * _min_silence_value(lsfm_values, last_speech, length) + \
-                          (1 - lambda_value) * _max_silence_value(lsfm_values, last_silence, length)
-        if lsfm_values[i] > threshold_value:
+        min_value = min_values[last_speech] if last_speech != 0 else 0
+        max_value = max_values[last_silence] if last_silence != 0 else 0
+        threshold_value = lambda_value * min_value + (1 - lambda_value) * max_value
+        if values[i] > threshold_value:
             result[i] = True
             last_speech = i
         else:
-            result[i] = False
             last_silence = i
     return result
 
 
-def _min_silence_value(lsfm_values, index, length):
-    if not index == 0:
-        return min(lsfm_values[i] for i in range(index - length + 1, index + 1))
-    else:
-        return 0
-
-
-def _max_silence_value(lsfm_values, index, length):
-    if not index == 0:
-        return max(lsfm_values[i] for i in range(index - length + 1, index + 1))
-    else:
-        return 0
-
-
-def _hz_to_index(hz, length, sample_rate):
-    return round(hz * length / sample_rate)
-
-
-def _to_mono(samples, channels):
-    if channels == 1:
-        return samples
-    else:
-        return np.array([np.mean(i) for i in np.split(samples, samples // channels)])
-
-
-def _samples_to_frames(samples, number_of_frames, samples_per_frame, samples_per_overlapping):
-    result = np.empty((number_of_frames, samples_per_frame), dtype=complex)
-    hann_window = np.hanning(samples_per_frame)
-    for i in range(0, number_of_frames):
-        start = i * (samples_per_frame - samples_per_overlapping)
-        result[i] = samples[start: start + samples_per_frame]*hann_window
-    return result
-
-
-def _decisions_to_silence_time_intervals(decisions, frame_length):
-    intervals = []
-    is_silence = not decisions[0]
-    if is_silence:
-        intervals.append(TimeInterval(0, frame_length))
-    for i in range(len(decisions)):
-        if not decisions[i]:
-            if is_silence:
-                last = intervals[len(intervals) - 1]
-                last.end += frame_length
-            else:
-                time = i * frame_length
-                intervals.append(TimeInterval(time, time + frame_length))
-            is_silence = True
-        else:
-            is_silence = False
-    return intervals
+def feature_bank(path, resample=True, bank=None):
+    """FeatureBank of the frames LSFM analyzes a wave file in, at 16 kHz for audio above it unless resample
+    is False. It shares the samples of the given bank when that has the same rate."""
+    with WaveSource(path) as audio:
+        rate = audio.getframerate()
+    if resample:
+        rate = analysis_rate(rate, _LAST_FREQUENCY)
+    if bank is not None and bank.sample_rate == rate:
+        return bank.reframed(_FRAME_LENGTH, _FRAME_STEP, np.hanning)
+    return FeatureBank(path, _FRAME_LENGTH, rate, _LAST_FREQUENCY, frame_step=_FRAME_STEP, window=np.hanning)
 
 
-def get_silence_intervals(path):
-    # initial constants
-    frame_length = 20  # ms
-    frame_overlapping = 10  # ms
+def get_silence_intervals(path, resample=True, bank=None):
     read_frames = 2048
 
-    # open file
-    (sample_rate, samples) = read(path)
-    audio = wave.open(path, "rb")
-    channels = audio.getnchannels()
-    samples_per_frame = int((sample_rate * frame_length * channels) / 1000)
-    samples_per_overlapping = int((sample_rate * frame_overlapping * channels) / 1000)
-    number_of_frames = len(samples) // (samples_per_frame - samples_per_overlapping) - 1
-
-    frames = _samples_to_frames(_to_mono(samples, channels), number_of_frames, samples_per_frame,
-                                samples_per_overlapping)
+    # the spectra of audio above 16 kHz cost more than resampling it, a given bank is analyzed at its rate
+    if bank is None:
+        bank = feature_bank(path, resample)
+    elif (bank.frame_length, bank.frame_step, bank.window) != (_FRAME_LENGTH, _FRAME_STEP, np.hanning):
+        bank = bank.reframed(_FRAME_LENGTH, _FRAME_STEP, np.hanning)
+    number_of_frames = bank.number_of_frames
+    mask = band_mask(_START_FREQUENCY, _LAST_FREQUENCY, bank.samples_per_frame, bank.sample_rate)
 
-    decisions = threshold(frames, sample_rate)
+    lsfm_values = lsfm(bank.magnitudes[:, mask], read_frames)
+    decisions = threshold(lsfm_values)
 
+    # speech needs percent of the next _R frames to be speech
     percent = 0.8
-    for i in range(_R + _M, number_of_frames):
-        limit = min(i + _R, number_of_frames)
-        count = sum(int(decisions[i]) for i in range(i, limit))
-        decisions[i] = count / (limit - i) >= percent
+    counts = _window_sums(np.append(decisions, np.zeros(_R - 1, dtype=bool)).astype(int), _R)
+    lengths = np.minimum(_R, number_of_frames - np.arange(number_of_frames))
+    smoothed = counts / lengths >= percent
+    decisions[_R + _M:] = smoothed[_R + _M:]
 
-    return _decisions_to_silence_time_intervals(decisions, frame_length - frame_overlapping)
+    begins, ends = silence_runs(decisions)
+    return to_time_intervals(begins, ends, _FRAME_STEP)
 
 
 
@@ -0,0 +1,124 @@
+__author__ = 'emptysamurai'
+
+import threading
+
+
+class RingBuffer:
+    """Bounded queue of preallocated blocks between one writing and one reading thread.
+
+    Blocks are filled in place through memoryviews, so steady playback allocates nothing. Every block
+    carries the position it starts at. flush() drops all the blocks and starts a new generation,
+    blocks written for an older generation are discarded on commit. Only the reading side flushes,
+    and only between blocks.
+    """
+
+    def __init__(self, depth, block_size):
+        self._views = [memoryview(bytearray(block_size)) for _ in range(depth)]
+        self._lengths = [0] * depth
+        self._positions = [0] * depth
+        self._head = 0
+        self._count = 0
+        self._generation = 0
+        self._write_position = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def block_size(self):
+        return len(self._views[0])
+
+    def writable(self):
+        """Waits for a free block, returns (block, generation, position to write from) or None when closed."""
+        with self._condition:
+            while self._count == len(self._views) and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            index = (self._head + self._count) % len(self._views)
+            return self._views[index], self._generation, self._write_position
+
+    def commit(self, length, next_position, generation):
+        """Makes the block from writable() readable unless the buffer was flushed since."""
+        with self._condition:
+            if generation != self._generation or self._closed:
+                return False
+            index = (self._head + self._count) % len(self._views)
+            self._lengths[index] = length
+            self._positions[index] = self._write_position
+            self._write_position = next_position
+            self._count += 1
+            self._condition.notify_all()
+            return True
+
+    def readable(self, timeout=None):
+        """Waits for a written block, returns (data, position) or None when closed or on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._count or self._closed, timeout) or self._closed:
+                return None
+            return self._views[self._head][:self._lengths[self._head]], self._positions[self._head]
+
+    def release(self):
+        """Frees the block from readable() for writing."""
+        with self._condition:
+            self._head = (self._head + 1) % len(self._views)
+            self._count -= 1
+            self._condition.notify_all()
+
+    def flush(self, position):
+        """Drops all the blocks, writing continues from the position."""
+        with self._condition:
+            self._generation += 1
+            self._count = 0
+            self._write_position = position
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class Prefetcher:
+    """Reads a WaveSource ahead of playback into a RingBuffer on its own thread.
+
+    Blocks are chunk_frames long, the last one is padded with silence and an empty block marks the end
+    of the audio. The thread lives until close(), seek() only flushes the buffer.
+    """
+
+    def __init__(self, audio, chunk_frames, depth):
+        self._audio = audio
+        self._chunk_frames = chunk_frames
+        self._frame_width = audio.getnchannels() * audio.getsampwidth()
+        # 8bit samples are unsigned, so their silence is 128
+        self._silence = b"\x80" if audio.getsampwidth() == 1 else b"\x00"
+        self._buffer = RingBuffer(depth, chunk_frames * self._frame_width)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            writable = self._buffer.writable()
+            if writable is None:
+                return
+            block, generation, position = writable
+            data = self._audio.frames(position, position + self._chunk_frames)
+            length = len(data)
+            block[:length] = data
+            if 0 < length < len(block):
+                block[length:] = self._silence * (len(block) - length)
+                length = len(block)
+            self._buffer.commit(length, position + len(data) // self._frame_width, generation)
+
+    def read(self, timeout=None):
+        """Next block as (data, position of its first frame), see RingBuffer.readable()."""
+        return self._buffer.readable(timeout)
+
+    def release(self):
+        self._buffer.release()
+
+    def seek(self, position):
+        self._buffer.flush(position)
+
+    def close(self):
+        self._buffer.close()
+        self._thread.join()
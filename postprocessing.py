@@ -0,0 +1,77 @@
+__author__ = 'emptysamurai'
+
+import numpy as np
+from timeinterval import IntervalArray
+
+
+class DecisionsSmoother:
+    """Removes too short speech and silence runs from a stream of frame decisions.
+
+    A run shorter than its minimum is given to the run that follows it. Frames before the start
+    of the current run can't change anymore, so silence runs ending there are returned as soon
+    as they are known.
+    """
+
+    def __init__(self, min_frames_speech, min_frames_silence):
+        self._min_frames_speech = min_frames_speech
+        self._min_frames_silence = min_frames_silence
+        self._is_speech = False
+        self._start = 0
+        self._length = 0
+        self._silence_start = None
+
+    def feed(self, decisions):
+        """Consumes the next decisions and returns silence runs (first frame, end frame) made final by them."""
+        silences = []
+        if not len(decisions):
+            return silences
+        previous = np.empty(len(decisions), dtype=bool)
+        previous[0] = self._is_speech
+        previous[1:] = decisions[:-1]
+        for boundary in np.flatnonzero(decisions != previous) + self._length:
+            boundary = int(boundary)
+            length = boundary - self._start
+            if length >= (self._min_frames_speech if self._is_speech else self._min_frames_silence):
+                self._commit(self._start, boundary, self._is_speech, silences)
+                self._start = boundary
+            self._is_speech = not self._is_speech
+        self._length += len(decisions)
+        return silences
+
+    def finish(self):
+        """Returns the silence runs that were waiting for the end of decisions."""
+        silences = []
+        self._commit(self._start, self._length, self._is_speech, silences)
+        if self._silence_start is not None:
+            silences.append((self._silence_start, self._length))
+            self._silence_start = None
+        return silences
+
+    def _commit(self, start, end, is_speech, silences):
+        if start == end:
+            return
+        if is_speech:
+            if self._silence_start is not None:
+                silences.append((self._silence_start, start))
+                self._silence_start = None
+        elif self._silence_start is None:
+            self._silence_start = start
+
+
+def silence_runs(decisions):
+    """First and end frames of every silence run of decisions as two arrays."""
+    padded = np.concatenate(([True], decisions, [True]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return changes[::2], changes[1::2]
+
+
+def remove_short_runs(decisions, min_frames_speech, min_frames_silence):
+    """First and end frames of silence runs left after removing too short runs, as two arrays."""
+    smoother = DecisionsSmoother(min_frames_speech, min_frames_silence)
+    runs = smoother.feed(decisions) + smoother.finish()
+    runs = np.array(runs, dtype=np.int64).reshape(-1, 2)
+    return runs[:, 0], runs[:, 1]
+
+
+def to_time_intervals(begins, ends, frame_length):
+    return IntervalArray(begins * frame_length, ends * frame_length)
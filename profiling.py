@@ -0,0 +1,135 @@
+__author__ = 'emptysamurai'
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from timeit import default_timer
+
+
+class Recorder(ABC):
+    """Receives the timing spans of instrumented stages while it is installed with set_recorder()."""
+
+    @abstractmethod
+    def record(self, name, start, end, counters):
+        """A span named name ran from start to end seconds of default_timer, counters is a dict of numbers."""
+
+
+class ProfileRecorder(Recorder):
+    """Keeps every span for a per-stage breakdown, a JSON report or a Chrome trace."""
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    @property
+    def spans(self):
+        return list(self._spans)
+
+    def record(self, name, start, end, counters):
+        with self._lock:
+            self._spans.append((name, start, end, threading.get_ident(), counters))
+
+    def stages(self):
+        """Totals of every span name in order of the first span: name, calls, seconds and summed counters."""
+        stages = {}
+        for name, start, end, _, counters in self._spans:
+            if name not in stages:
+                stages[name] = {"name": name, "first": start, "calls": 0, "time": 0, "counters": {}}
+            stage = stages[name]
+            stage["first"] = min(stage["first"], start)
+            stage["calls"] += 1
+            stage["time"] += end - start
+            for counter, value in counters.items():
+                stage["counters"][counter] = stage["counters"].get(counter, 0) + value
+        result = sorted(stages.values(), key=lambda stage: stage["first"])
+        for stage in result:
+            del stage["first"]
+        return result
+
+    def breakdown(self):
+        """Lines of a table of the stages, nested stages are included in the time of the outer ones."""
+        if not self._spans:
+            return []
+        total = max(end for _, _, end, _, _ in self._spans) - min(start for _, start, _, _, _ in self._spans)
+        lines = ["%-28s %8s %10s %7s  %s" % ("stage", "calls", "seconds", "share", "counters")]
+        for stage in self.stages():
+            counters = ", ".join("%s=%s" % item for item in sorted(stage["counters"].items()))
+            lines.append("%-28s %8d %10.4f %6.1f%%  %s" % (stage["name"], stage["calls"], stage["time"],
+                                                          100 * stage["time"] / total if total else 0, counters))
+        return lines
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"stages": self.stages(),
+                       "spans": [{"name": name, "start": start, "end": end, "thread": thread, "counters": counters}
+                                 for name, start, end, thread, counters in self._spans]}, f, indent=2)
+
+    def write_chrome_trace(self, path):
+        """Writes the spans in the trace event format of chrome://tracing and Perfetto."""
+        origin = min((start for _, start, _, _, _ in self._spans), default=0)
+        events = [{"name": name, "ph": "X", "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6,
+                   "pid": os.getpid(), "tid": thread, "args": counters}
+                  for name, start, end, thread, counters in self._spans]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class _Span:
+    __slots__ = ("_recorder", "_name", "_counters", "_start")
+
+    def __init__(self, recorder, name, counters):
+        self._recorder = recorder
+        self._name = name
+        self._counters = counters
+
+    def count(self, counter, value=1):
+        self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def __enter__(self):
+        self._start = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self._recorder.record(self._name, self._start, default_timer(), self._counters)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def count(self, counter, value=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_recorder = None
+
+
+def set_recorder(recorder):
+    """Installs the recorder of all spans, None turns profiling off. Returns the previous recorder."""
+    global _recorder
+    previous = _recorder
+    _recorder = recorder
+    return previous
+
+
+def get_recorder():
+    return _recorder
+
+
+def span(name, **counters):
+    """Context manager timing the stage name with the given counters, more can be added with count().
+
+    Without a recorder a shared object that does nothing is returned, so instrumentation costs a global
+    lookup and a call.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name, counters)
@@ -0,0 +1,115 @@
+__author__ = 'emptysamurai'
+
+import math
+from functools import lru_cache
+import numpy as np
+from scipy.signal import firwin, kaiserord, resample_poly
+from profiling import span
+
+_ANALYSIS_RATES = (8000, 16000)
+_MAX_RATE = 16000
+_PASSBAND = 0.8  # share of the nyquist frequency that may be analyzed
+_ATTENUATION = 60  # dB
+
+
+def analysis_rate(sample_rate, max_frequency):
+    """Rate the audio is analyzed at: the lowest of 8 and 16 kHz that keeps max_frequency for rates above
+    16 kHz and the rate itself otherwise."""
+    if sample_rate <= _MAX_RATE:
+        return sample_rate
+    for rate in _ANALYSIS_RATES:
+        if max_frequency <= _PASSBAND * rate / 2:
+            return rate
+    return sample_rate
+
+
+def _ratio(sample_rate, target_rate):
+    divisor = math.gcd(sample_rate, target_rate)
+    return target_rate // divisor, sample_rate // divisor
+
+
+@lru_cache(maxsize=None)
+def _filter(sample_rate, target_rate, max_frequency):
+    # only frequencies folding below max_frequency have to be removed, so the transition band spans from
+    # max_frequency to target_rate - max_frequency and the filter is much shorter than the default one
+    up, down = _ratio(sample_rate, target_rate)
+    nyquist = sample_rate * up / 2
+    length, beta = kaiserord(_ATTENUATION, (target_rate - 2 * max_frequency) / nyquist)
+    half_length = length // 2
+    taps = firwin(2 * half_length + 1, target_rate / 2 / nyquist, window=("kaiser", beta))
+    # input samples the filter reaches on each side, rounded up to a multiple of down
+    context = (half_length // up // down + 2) * down
+    return up, down, taps, context
+
+
+def resampled_length(length, sample_rate, target_rate):
+    up, down = _ratio(sample_rate, target_rate)
+    return -(-length * up // down)
+
+
+def decimate_range(read, length, start, stop, sample_rate, target_rate, max_frequency):
+    """Samples from start to stop of resampling length samples to target_rate keeping frequencies up to
+    max_frequency, equal to the same part of resampling all of them. read(begin, end) returns the input
+    samples from begin to end, 2-D input is resampled along the first axis.
+    """
+    up, down, taps, context = _filter(sample_rate, target_rate, max_frequency)
+    # input blocks starting at multiples of down give output starting at multiples of up
+    begin = start // up * down - context
+    end = -(-stop * down // up) + context
+    data = read(max(begin, 0), min(end, length))
+    with span("resample", samples=stop - start):
+        samples = np.zeros((end - begin,) + np.shape(data)[1:])
+        samples[max(begin, 0) - begin:min(end, length) - begin] = data
+        offset = begin // down * up
+        return resample_poly(samples, up, down, axis=0, window=taps)[start - offset:stop - offset]
+
+
+class Decimator:
+    """Anti-aliased polyphase resampling of a stream of sample blocks.
+
+    Output is the same as decimate_range of the whole stream, given out as soon as the filter has all the
+    input it needs.
+    """
+
+    def __init__(self, sample_rate, target_rate, max_frequency):
+        self._sample_rate = sample_rate
+        self._target_rate = target_rate
+        self._max_frequency = max_frequency
+        self._up, self._down, _, self._context = _filter(sample_rate, target_rate, max_frequency)
+        self._buffer = None
+        self._offset = 0  # input index of the first buffered sample
+        self._length = 0
+        self._done = 0
+
+    def _read(self, begin, end):
+        return self._buffer[begin - self._offset:end - self._offset]
+
+    def _produce(self, stop):
+        if stop <= self._done:
+            return np.zeros(0)
+        result = decimate_range(self._read, self._length, self._done, stop, self._sample_rate, self._target_rate,
+                                self._max_frequency)
+        self._done = stop
+        # only the context of the next output is kept
+        first_needed = max(self._done // self._up * self._down - self._context, 0)
+        self._buffer = self._buffer[first_needed - self._offset:]
+        self._offset = first_needed
+        return result
+
+    def feed(self, samples):
+        self._buffer = samples if self._buffer is None else np.concatenate((self._buffer, samples))
+        self._length += len(samples)
+        return self._produce(max((self._length - self._context) // self._down * self._up, 0))
+
+    def finish(self):
+        return self._produce(resampled_length(self._length, self._sample_rate, self._target_rate))
+
+    def blocks(self, blocks):
+        """Resampled blocks of the given blocks, empty ones are skipped."""
+        for samples in blocks:
+            result = self.feed(samples)
+            if len(result):
+                yield result
+        result = self.finish()
+        if len(result):
+            yield result
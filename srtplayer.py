@@ -13,6 +13,8 @@ class PlayerWidget(QtGui.QWidget):
         super(PlayerWidget, self).__init__()
         self._window = window
         self.player = SrtPlayer()
+        self._load_progress = None
+        self._file_name = None
         self.setAcceptDrops(True)
         self.init_ui()
 
@@ -26,7 +28,11 @@ class PlayerWidget(QtGui.QWidget):
         self._text_field = text_field = QtGui.QTextEdit()
         text_field.setReadOnly(True)
         # text_field.setFont(QtGui.QFont("Helvetica", 14))
-        self.player.text_changed.connect(self.update_text)
+        self.player.text_changed.connect(self.update_text, QtCore.Qt.QueuedConnection)
+        self.player.audio_loaded.connect(self.audio_loaded, QtCore.Qt.QueuedConnection)
+        self.player.subs_loaded.connect(self.subs_loaded, QtCore.Qt.QueuedConnection)
+        self.player.load_progress.connect(self.update_load_progress, QtCore.Qt.QueuedConnection)
+        self.player.load_failed.connect(self.load_failed, QtCore.Qt.QueuedConnection)
 
         self._slider = slider = QtGui.QSlider(QtCore.Qt.Horizontal)
         slider.setMinimumWidth(300)
@@ -88,23 +94,48 @@ class PlayerWidget(QtGui.QWidget):
         self.open_file(file_name)
 
     def open_file(self, file_name):
+        # loading goes on in the background, the player reports back with signals
         if not file_name.strip():
             return
         path = PurePath(file_name)
         if path.suffix == ".srt":
-            try:
-                self.player.load_subs(file_name)
-            except ValueError as e:
-                self._text_field.setPlainText(str(e))
+            self.player.load_subs_async(file_name)
         else:
-            try:
-                self.player.open(file_name)
-            except Exception as e:
-                self._text_field.setPlainText(str(e))
-                self._window.setWindowTitle(self._WINDOW_TITLE + " - " + "Error")
-            else:
-                self._text_field.setPlainText("")
-                self._window.setWindowTitle(self._WINDOW_TITLE + " - " + file_name)
+            self.player.open_async(file_name)
+            self._window.setWindowTitle(self._WINDOW_TITLE + " - " + "Loading")
+        self._play_pause_button.setEnabled(self.player.loaded)
+        self._slider.setEnabled(self.player.loaded)
+        self.update_status_bar()
+
+    @QtCore.Slot(str)
+    def audio_loaded(self, file_name):
+        self._text_field.setPlainText("")
+        self._file_name = file_name
+        self._window.setWindowTitle(self._WINDOW_TITLE + " - " + file_name)
+        self._play_pause_button.setEnabled(self.player.loaded)
+        self._slider.setEnabled(self.player.loaded)
+        self.update_status_bar()
+
+    @QtCore.Slot()
+    def subs_loaded(self):
+        self._load_progress = None
+        self.update_status_bar()
+
+    @QtCore.Slot(int)
+    def update_load_progress(self, percent):
+        self._load_progress = percent
+        self.update_status_bar()
+
+    @QtCore.Slot(str)
+    def load_failed(self, message):
+        self._load_progress = None
+        self._text_field.setPlainText(message)
+        # audio that failed to open is unloaded, subtitles that failed leave the audio loaded
+        if self.player.loaded:
+            self._window.setWindowTitle(self._WINDOW_TITLE + " - " + self._file_name)
+        else:
+            self._file_name = None
+            self._window.setWindowTitle(self._WINDOW_TITLE + " - " + "Error")
         self._play_pause_button.setEnabled(self.player.loaded)
         self._slider.setEnabled(self.player.loaded)
         self.update_status_bar()
@@ -130,6 +161,8 @@ class PlayerWidget(QtGui.QWidget):
                 message += str(hours) + ":" + self.str_with_zeros(minutes, 2) + ":" + self.str_with_zeros(total_seconds, 2)
         else:
             message = "Not loaded"
+        if self._load_progress is not None:
+            message += ", loading subtitles " + str(self._load_progress) + "%"
 
         status_bar.showMessage(message)
 
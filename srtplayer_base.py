@@ -1,16 +1,34 @@
-import alsaaudio
 from pathlib import PurePath
-from subrip import SubRip
-import wave
+from subrip import SubRip, SubRipCursor
+from audiosource import WaveSource
+from playback import Prefetcher
+from audiooutput import AlsaOutput
+import os
+import queue
 import threading
 from math import ceil
+from timeit import default_timer
 from PySide import QtCore
 
 
 class SrtPlayer(QtCore.QObject):
+    """Plays audio on a long-lived worker thread controlled through a queue of commands.
+
+    Play, pause and seek only queue a command and return, the worker takes it at the next chunk
+    boundary. Audio, output and prefetcher are owned by the worker.
+    """
+
     _CHUNK = 1024
+    _BUFFER_DEPTH = 8
+    _REPLY_TIMEOUT = 0.1  # s between checks that the worker is still running
+
+    _PROGRESS_LINES = 4096
 
     text_changed = QtCore.Signal(str)
+    audio_loaded = QtCore.Signal(str)
+    subs_loaded = QtCore.Signal()
+    load_progress = QtCore.Signal(int)
+    load_failed = QtCore.Signal(str)
 
     @property
     def sub(self):
@@ -18,23 +36,22 @@ class SrtPlayer(QtCore.QObject):
 
     @property
     def time(self):
-        if self.loaded:
-            return self._audio.tell() / (self._audio.getframerate() * self._audio.getnchannels()) * 1000
+        audio = self._audio
+        if audio is not None:
+            return self._position / audio.getframerate() * 1000
         else:
             return 0
 
     @time.setter
     def time(self, value):
-        if self.loaded:
+        audio = self._audio
+        if audio is not None:
             if 0 <= value <= self.length:
-                pos = value * self._audio.getframerate() * self._audio.getnchannels() / 1000
+                pos = value * audio.getframerate() / 1000
                 pos = ceil(pos)
-                play = self._playing
-                self.pause()
-                self._audio.setpos(pos)
-                self._update_subs()
-                if play:
-                    self.play()
+                self._position = pos
+                self._seeks += 1
+                self._commands.put(("seek", (pos, (self._seeks, default_timer())), None))
             else:
                 self.pause()
                 raise ValueError("Attempt to set incorrect time")
@@ -51,30 +68,56 @@ class SrtPlayer(QtCore.QObject):
     def loaded(self):
         return self._audio is not None
 
-    def __init__(self):
+    @property
+    def seek_latency(self):
+        """Seconds from the last seek during playback until audio from the new position went to the
+        output, None until that seek is measured."""
+        latency = self._seek_latency
+        if latency is None or latency[0] != self._seeks:
+            return None
+        return latency[1]
+
+    def __init__(self, output=None, chunk_frames=_CHUNK, buffer_depth=_BUFFER_DEPTH):
         super(SrtPlayer, self).__init__()
+        self._chunk_frames = chunk_frames
+        self._buffer_depth = buffer_depth
         self._playing = False
-        self._device = alsaaudio.PCM()
+        self._device = output if output is not None else AlsaOutput()
         self._length = None
         self._audio = None
-        self._audio_thread = None
+        self._prefetcher = None
+        self._position = 0
         self._subs = None
+        self._cursor = None
         self._sub = None
+        self._output_playing = False
+        self._seek_requested = None
+        self._seek_latency = None  # (number of the seek, seconds)
+        self._seeks = 0
+        self._loading = None
+        self._loading_lock = threading.Lock()
+        self._commands = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
 
     def play(self):
         if self.loaded and not self._playing:
-            self._audio_thread = threading.Thread(target=self._update)
             self._playing = True
-            self._audio_thread.start()
+            self._commands.put(("play", (), None))
 
     def pause(self):
         self._playing = False
-        if self._audio_thread is not None:
-            self._audio_thread.join()
+        self._commands.put(("pause", (), None))
 
     def close(self):
+        if self._closed:
+            return
         self.pause()
-        self._device.close()
+        self.cancel_loading()
+        self._call("close")
+        self._closed = True
+        self._worker.join()
 
     def play_pause(self):
         if self._playing:
@@ -82,71 +125,222 @@ class SrtPlayer(QtCore.QObject):
         else:
             self.play()
 
-    def _update(self):
-        data = self._audio.readframes(self._CHUNK)
-        while data and self._playing:
-            length = len(data) // self._audio.getsampwidth()
-            if length != self._CHUNK:
-                data += b"\x00" * (self._CHUNK - length) * self._audio.getsampwidth()
-            self._device.write(data)
-            self._update_subs()
-            data = self._audio.readframes(self._CHUNK)
-        if data == '':
+    def _call(self, name, *arguments):
+        # queues a command and waits until the worker has run it, the worker stops after closing
+        if self._closed:
+            raise ValueError("Player is closed")
+        reply = queue.Queue(1)
+        self._commands.put((name, arguments, reply))
+        while True:
+            try:
+                error = reply.get(timeout=self._REPLY_TIMEOUT)
+                break
+            except queue.Empty:
+                if not self._worker.is_alive():
+                    raise ValueError("Player is closed")
+        if error is not None:
+            raise error
+
+    def _run(self):
+        handlers = {"play": self._on_play, "pause": self._on_pause, "seek": self._on_seek,
+                    "load": self._on_load, "close": self._on_close}
+        while True:
+            try:
+                name, arguments, reply = self._commands.get(block=not self._output_playing)
+            except queue.Empty:
+                self._write_chunk()
+                continue
+            error = None
+            try:
+                handlers[name](*arguments)
+            except Exception as err:
+                error = err
+            if reply is not None:
+                reply.put(error)
+            if name == "close":
+                return
+
+    def _write_chunk(self):
+        # only drains blocks the prefetcher has read ahead
+        data, position = self._prefetcher.read()
+        if not len(data):
+            self._prefetcher.release()
             self._playing = False
-            self._audio.rewind()
+            self._output_playing = False
+            self._on_seek(0, None)
+            return
+        if self._seek_requested is not None:
+            seek, requested = self._seek_requested
+            self._seek_latency = (seek, default_timer() - requested)
+            self._seek_requested = None
+        self._device.write(data)
+        self._prefetcher.release()
+        self._position = min(position + self._chunk_frames, self._audio.getnframes())
+        self._update_subs()
+
+    def _on_play(self):
+        self._output_playing = self._audio is not None
+
+    def _on_pause(self):
+        self._output_playing = False
+
+    def _on_seek(self, position, requested):
+        if self._prefetcher is None:
+            return
+        self._position = position
+        self._prefetcher.seek(position)
+        self._seek_requested = requested if self._output_playing else None
+        self._update_subs()
+
+    def _on_load(self, audio):
+        self._close_audio()
+        if audio is None:
+            return
+        try:
+            self._device.configure(audio.getnchannels(), audio.getframerate(), audio.getsampwidth(),
+                                   self._chunk_frames)
+        except ValueError:
+            audio.close()
+            raise
+        self._position = 0
+        self._prefetcher = Prefetcher(audio, self._chunk_frames, self._buffer_depth)
+        self._audio = audio
+
+    def _on_close(self):
+        self._close_audio()
+        self._device.close()
+
+    def _close_audio(self):
+        self._output_playing = False
+        self._seek_requested = None
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        if self._audio is not None:
+            audio = self._audio
+            self._audio = None
+            audio.close()
 
     def load_subs(self, subs_path):
         with open(subs_path) as subs:
-            self._subs = SubRip.parse(subs.read())
+            self._set_subs(SubRip.from_elements(SubRip.iterparse(subs)))
         self._sub = None
-        self._emit_sub_changed_new_thread()
+        self._emit_sub_changed()
 
     def open(self, audio):
         self.pause()
         path = PurePath(audio)
-        if path.suffix == ".wav":
-            self._audio = wave.open(audio, "rb")
-        else:
-            self._audio = None
-            raise ValueError("Unsupported format " + path.suffix)
-        self._length = self._audio.getnframes() / self._audio.getframerate() / self._audio.getnchannels() * 1000
-        self._device.setchannels(self._audio.getnchannels())
-        self._device.setrate(self._audio.getframerate())
-
-        # 8bit is unsigned in wav files
-        if self._audio.getsampwidth() == 1:
-            self._device.setformat(alsaaudio.PCM_FORMAT_U8)
-        # Otherwise we assume signed data, little endian
-        elif self._audio.getsampwidth() == 2:
-            self._device.setformat(alsaaudio.PCM_FORMAT_S16_LE)
-        elif self._audio.getsampwidth() == 3:
-            self._device.setformat(alsaaudio.PCM_FORMAT_S24_LE)
-        elif self._audio.getsampwidth() == 4:
-            self._device.setformat(alsaaudio.PCM_FORMAT_S32_LE)
-        else:
-            raise ValueError('Unsupported format')
-
-        self._device.setperiodsize(self._CHUNK)
+        try:
+            self._load_audio(audio)
+        except Exception:
+            self._unload()
+            raise
 
         try:
             with open(str(path.with_suffix(".srt"))) as subs:
-                self._subs = SubRip.parse(subs.read())
+                self._set_subs(SubRip.from_elements(SubRip.iterparse(subs)))
         except Exception:
-            self._subs = None
-        self._emit_sub_changed_new_thread()
+            self._set_subs(None)
+        self._emit_sub_changed()
+
+    def open_async(self, audio):
+        """Loads audio and subtitles of the same name on a loader thread and returns at once.
+
+        audio_loaded is emitted as soon as the audio can be played, subs_loaded when subtitles are
+        parsed with load_progress in percents on the way, load_failed with the error otherwise.
+        Loading that hasn't finished yet is cancelled.
+        """
+        self.pause()
+        self._start_loading(audio, str(PurePath(audio).with_suffix(".srt")), False)
+
+    def load_subs_async(self, subs_path):
+        """Parses subtitles on a loader thread like open_async."""
+        self._start_loading(None, subs_path, True)
+
+    def cancel_loading(self):
+        if self._loading is not None:
+            self._loading.set()
+
+    def _load_audio(self, audio_path):
+        if PurePath(audio_path).suffix != ".wav":
+            raise ValueError("Unsupported format " + PurePath(audio_path).suffix)
+        audio = WaveSource(audio_path)
+        self._length = audio.getnframes() / audio.getframerate() * 1000
+        self._call("load", audio)
+
+    def _unload(self):
+        # audio that failed to open leaves nothing loaded, neither the previous audio nor its subtitles
+        self._call("load", None)
+        self._length = None
+        self._set_subs(None)
+        self._sub = None
+        self._emit_sub_changed()
+
+    def _start_loading(self, audio_path, subs_path, subs_required):
+        self.cancel_loading()
+        self._loading = cancelled = threading.Event()
+        threading.Thread(target=self._load, args=(cancelled, audio_path, subs_path, subs_required),
+                         daemon=True).start()
+
+    def _load(self, cancelled, audio_path, subs_path, subs_required):
+        try:
+            if audio_path is not None:
+                with self._loading_lock:
+                    if cancelled.is_set():
+                        return
+                    try:
+                        self._load_audio(audio_path)
+                    except Exception:
+                        self._unload()
+                        raise
+                self.audio_loaded.emit(audio_path)
+            try:
+                subs = self._parse_subs(subs_path, cancelled)
+            except Exception:
+                if subs_required:
+                    raise
+                subs = None
+            with self._loading_lock:
+                if cancelled.is_set():
+                    return
+                self._set_subs(subs)
+                self._sub = self._cursor.move(self.time) if self._cursor is not None else None
+                self._emit_sub_changed()
+            self.subs_loaded.emit()
+        except Exception as err:
+            if not cancelled.is_set():
+                self.load_failed.emit(str(err))
+
+    def _parse_subs(self, subs_path, cancelled):
+        # progress is the share of the file read so far
+        size = max(os.path.getsize(subs_path), 1)
+        with open(subs_path) as subs:
+            def lines():
+                for i, line in enumerate(subs):
+                    if i % self._PROGRESS_LINES == 0:
+                        if cancelled.is_set():
+                            return
+                        self.load_progress.emit(min(100 * subs.buffer.tell() // size, 100))
+                    yield line
+            result = SubRip.from_elements(SubRip.iterparse(lines()))
+        self.load_progress.emit(100)
+        return result
+
+    def _set_subs(self, subs):
+        self._subs = subs
+        self._cursor = SubRipCursor(subs) if subs is not None else None
 
     def _emit_sub_changed(self):
+        # emitted from the audio thread too, receivers in the GUI thread get it queued
         if self.sub is None:
             self.text_changed.emit("")
         else:
             self.text_changed.emit(self.sub.text)
 
-    def _emit_sub_changed_new_thread(self):
-        threading.Thread(target=self._emit_sub_changed).start()
-
     def _update_subs(self):
-        if self._subs is not None:
-            sub = self._subs.find(self.time)
+        cursor = self._cursor
+        if cursor is not None:
+            sub = cursor.move(self.time)
             if sub is not self._sub:
                 self._sub = sub
-                self._emit_sub_changed_new_thread()
\ No newline at end of file
+                self._emit_sub_changed()
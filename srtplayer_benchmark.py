@@ -0,0 +1,74 @@
+__author__ = 'emptysamurai'
+
+import argparse
+import random
+import time
+from pathlib import PurePath
+from timeit import default_timer
+from audiooutput import NullOutput, FileOutput
+from srtplayer_base import SrtPlayer
+from subrip import SubRip
+
+
+def _record_lag(lags, player, subs, text):
+    # playback may have left the cue or reached a gap by the time the signal is handled
+    element = subs.find(player.time) if text else None
+    if element is not None:
+        lags.append(player.time - element.interval.begin)
+
+
+def _wait_until_stopped(player):
+    while player.playing:
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays audio with subtitles without a sound device and "
+                                                 "measures the player")
+    parser.add_argument("audio_path", help="Path to the audio wave file with subtitles of the same name")
+    parser.add_argument("--realtime", action="store_true", help="Pace playback to real time")
+    parser.add_argument("--record", help="Save played audio to a wave (.wav) or raw file instead of discarding it")
+    parser.add_argument("--chunk", type=int, default=SrtPlayer._CHUNK, help="Frames written at once")
+    parser.add_argument("--depth", type=int, default=SrtPlayer._BUFFER_DEPTH, help="Chunks read ahead")
+    parser.add_argument("--seeks", type=int, default=0, help="Number of random seeks during playback")
+    args = parser.parse_args()
+
+    output = FileOutput(args.record) if args.record else NullOutput(realtime=args.realtime)
+    player = SrtPlayer(output, chunk_frames=args.chunk, buffer_depth=args.depth)
+    player.open(args.audio_path)
+    with open(str(PurePath(args.audio_path).with_suffix(".srt"))) as f:
+        subs = SubRip.from_elements(SubRip.iterparse(f))
+
+    # emitted in the audio thread, so the lag is measured in played audio
+    lags = []
+    player.text_changed.connect(lambda text: _record_lag(lags, player, subs, text))
+    start = default_timer()
+    player.play()
+    if args.seeks:
+        # random seeks during playback instead of playing to the end
+        seek_latencies = []
+        random.seed(0)
+        for i in range(args.seeks):
+            time.sleep(0.1)
+            player.time = random.uniform(0, player.length * 0.9)
+            time.sleep(0.1)
+            # None until this seek reached the output, so no latency is counted twice
+            latency = player.seek_latency
+            if latency is not None:
+                seek_latencies.append(latency * 1000)
+        player.close()
+        if seek_latencies:
+            print("Seeks: %d, %d measured, latency mean %.2f ms, max %.2f ms" %
+                  (args.seeks, len(seek_latencies), sum(seek_latencies) / len(seek_latencies),
+                   max(seek_latencies)))
+        else:
+            print("Seeks: %d, no latency measured" % args.seeks)
+    else:
+        _wait_until_stopped(player)
+        wall_time = default_timer() - start
+        player.close()
+        print("Played %.1f s of audio in %.2f s, %.1fx real time" %
+              (player.length / 1000, wall_time, player.length / 1000 / wall_time))
+        if lags:
+            print("Subtitle switches: %d, lag after cue begin mean %.1f ms, max %.1f ms" %
+                  (len(lags), sum(lags) / len(lags), max(lags)))
@@ -1,5 +1,39 @@
+import io
+import os
 import re
-from timeinterval import TimeInterval
+import tempfile
+import numpy as np
+from timeinterval import TimeInterval, IntervalArray
+
+_TIME_FORMAT = "%02d:%02d:%02d,%03d"
+_HEADER_FORMAT = "%d\n%s ---> %s\n"
+_BUFFER_SIZE = 1 << 16
+_NUMBER_PATTERN = re.compile(r"\s*[0-9]+\s*$")
+_TIMING_PATTERN = re.compile(r"\s*([0-9]+):([0-9]+):([0-9]+)[,.]([0-9]+)\s+-+>\s+([0-9]+):([0-9]+):([0-9]+)[,.]([0-9]+)")
+
+
+def _file_mode(path):
+    # mkstemp creates files only the owner can read, open() would keep the mode of an existing file
+    # or apply the umask to a new one
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _ms_to_str(ms):
+    seconds, milliseconds = divmod(int(round(ms)), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return _TIME_FORMAT % (hours, minutes, seconds, milliseconds)
+
+
+def _match_to_interval(match):
+    from_h, from_m, from_s, from_ms, to_h, to_m, to_s, to_ms = map(int, match.groups())
+    return TimeInterval(from_ms + 1000 * from_s + 60000 * from_m + 3600000 * from_h,
+                        to_ms + 1000 * to_s + 60000 * to_m + 3600000 * to_h)
 
 
 class SubRipElement:
@@ -33,34 +67,13 @@ class SubRipElement:
         self._number = number
 
     def __str__(self):
-        subtitle = str(self.number) + "\n"
-        subtitle += self._ms_to_str(self.interval.begin) + " ---> " + self._ms_to_str(self.interval.end) + "\n"
-        subtitle += self.text
-        if self.text[len(self.text) - 1] != "\n":
-            subtitle += "\n"
-        subtitle += "\n"
-        return subtitle
+        return "".join(self.lines())
 
-    @staticmethod
-    def _ms_to_str(ms):
-        ms /= 1000
-        total_seconds = int(ms)
-        after_point = ms - total_seconds
-        hours = total_seconds // 3600
-        total_seconds -= hours * 60 * 60
-        minutes = total_seconds // 60
-        total_seconds -= minutes * 60
-        milliseconds = int(round(after_point * 1000))
-        return SubRipElement._str_with_zeros(hours, 2) + \
-               ":" + SubRipElement._str_with_zeros(minutes, 2) + \
-               ":" + SubRipElement._str_with_zeros(total_seconds, 2) + \
-               "," + SubRipElement._str_with_zeros(milliseconds, 3)
-
-    @staticmethod
-    def _str_with_zeros(number, length):
-        number_str = str(number)
-        number_str = "0" * (length - len(number_str)) + number_str
-        return number_str
+    def lines(self):
+        text = self.text
+        yield _HEADER_FORMAT % (self.number, _ms_to_str(self.interval.begin), _ms_to_str(self.interval.end))
+        yield text
+        yield "\n\n" if not text.endswith("\n") else "\n"
 
 
 class SubRip:
@@ -73,54 +86,132 @@ class SubRip:
             raise ValueError("Number of intervals must be equal to number of texts")
         if (numbers is not None) and (len(intervals) != len(numbers)):
             raise ValueError("Number of intervals must be equal to number of numbers")
-        self._elements = [None] * len(intervals)
-        for i in range(len(intervals)):
-            if i != 0 and intervals[i - 1].begin > intervals[i].begin:
-                raise ValueError("Intervals are unordered. Interval at " + str(i - 1) + " is later than next interval.")
-
-            if numbers is None:
-                self._elements[i] = SubRipElement(i + 1, intervals[i], texts[i])
-            else:
-                self._elements[i] = SubRipElement(numbers[i], intervals[i], texts[i])
+        index = IntervalArray.from_intervals(intervals)
+        unordered = np.flatnonzero(index.begins[:-1] > index.begins[1:])
+        if len(unordered):
+            raise ValueError("Intervals are unordered. Interval at " + str(unordered[0]) + " is later than next interval.")
+        # begins, ends and the latest end up to each cue answer time queries with searchsorted,
+        # as floats so that searchsorted never converts the whole index to the type of the time
+        self._begins = index.begins.astype(np.float64)
+        self._ends = index.ends.astype(np.float64)
+        self._latest_ends = np.maximum.accumulate(self._ends) if len(index) else self._ends
+        if numbers is None:
+            numbers = range(1, len(intervals) + 1)
+        self._elements = [SubRipElement(number, intervals[i], texts[i]) for i, number in enumerate(numbers)]
 
     def __str__(self):
-        subtitles = ""
-        for subtitle in self._elements:
-            subtitles += str(subtitle)
-        return subtitles
+        return "".join(self.iter_lines())
+
+    def iter_lines(self):
+        """Yields the file in pieces, a few per cue, without building it as a whole."""
+        for element in self._elements:
+            yield from element.lines()
+
+    def write(self, fp):
+        """Writes subtitles to a file object or to a path.
+
+        A file at the path is replaced atomically only when all the subtitles are written.
+        """
+        if hasattr(fp, "write"):
+            fp.writelines(self.iter_lines())
+            return
+        directory = os.path.dirname(os.path.abspath(fp))
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with io.open(descriptor, "w", buffering=_BUFFER_SIZE) as f:
+                f.writelines(self.iter_lines())
+            os.chmod(temporary, _file_mode(fp))
+            os.replace(temporary, fp)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
 
     def find(self, time):
-        index_min = 0
-        index_max = len(self.elements) - 1
-        while index_max >= index_min:
-            index_mid = (index_min + index_max) // 2
-            mid_interval = self.elements[index_mid].interval
-            if mid_interval.contains(time):
-                return self.elements[index_mid]
-            elif mid_interval.is_earlier(time):
-                index_min = index_mid + 1
-            else:
-                index_max = index_mid - 1
+        """The earliest cue containing time or None."""
+        i = np.searchsorted(self._latest_ends, time)
+        if i < len(self._elements) and self._begins[i] <= time:
+            return self._elements[i]
         return None
 
+    def find_span(self, time):
+        """find(time) and the times (after, until] around it for which find gives the same result."""
+        i = np.searchsorted(self._latest_ends, time)
+        after = self._latest_ends[i - 1] if i > 0 else -np.inf
+        if i < len(self._elements) and self._begins[i] <= time:
+            return self._elements[i], max(after, np.nextafter(self._begins[i], -np.inf)), self._ends[i]
+        until = np.nextafter(self._begins[i], -np.inf) if i < len(self._elements) else np.inf
+        return None, after, until
+
+    def find_range(self, begin, end):
+        """All cues overlapping the time from begin to end, ordered by begin."""
+        first = np.searchsorted(self._latest_ends, begin)
+        last = np.searchsorted(self._begins, end, side="right")
+        overlapping = first + np.flatnonzero(self._ends[first:last] >= begin)
+        return [self._elements[i] for i in overlapping]
+
+    @staticmethod
+    def iterparse(fp):
+        """Yields cues of a file object or an iterable of lines as soon as they are read.
+
+        A cue starts with a number line and a timing line after at least one blank line (or at the
+        beginning), everything else up to the next cue is its text. CRLF line ends, a byte order mark
+        and extra blank lines are tolerated.
+        """
+        number = None
+        interval = None
+        text_lines = []
+        blank_lines = 0
+        number_line = None  # possible start of the next cue, waiting for a timing line
+        for i, line in enumerate(fp):
+            line = line.rstrip("\r\n")
+            if i == 0:
+                line = line.lstrip("\ufeff")
+            if number_line is not None:
+                match = _TIMING_PATTERN.match(line)
+                if match is not None:
+                    if number is not None:
+                        yield SubRipElement(number, interval, "\n".join(text_lines))
+                    number = int(number_line)
+                    interval = _match_to_interval(match)
+                    text_lines = []
+                    blank_lines = 0
+                    number_line = None
+                    continue
+                # not a cue after all
+                text_lines.extend([""] * blank_lines)
+                text_lines.append(number_line)
+                blank_lines = 0
+                number_line = None
+            if not line.strip():
+                blank_lines += 1
+            elif (blank_lines or number is None) and _NUMBER_PATTERN.match(line):
+                number_line = line.strip()
+            else:
+                text_lines.extend([""] * blank_lines)
+                text_lines.append(line)
+                blank_lines = 0
+        if number is not None:
+            if number_line is not None:
+                text_lines.extend([""] * blank_lines)
+                text_lines.append(number_line)
+            yield SubRipElement(number, interval, "\n".join(text_lines))
+
     @classmethod
-    def parse(cls, text):
-        pattern = r"(?P<number>\d+)\n(?P<from_h>\d+):(?P<from_m>\d+):(?P<from_s>\d+),(?P<from_ms>\d+)\s+-+>\s+(?P<to_h>\d+):(?P<to_m>\d+):(?P<to_s>\d+),(?P<to_ms>\d+)\n(?P<text>(.|\n)*?)(?=\n{2,}\d+\n\d+:\d+:\d+,\d+\s+-+>\s+\d+:\d+:\d+,\d+\n|\n*$)"
-        r = re.compile(pattern)
-        subs_decomposed = [m.groupdict() for m in r.finditer(text)]
-        intervals = [None] * len(subs_decomposed)
-        texts = [None] * len(subs_decomposed)
-        numbers = [0] * len(subs_decomposed)
-        for i, sub in enumerate(subs_decomposed):
-            numbers[i] = int(sub["number"])
-            from_ms = int(sub["from_ms"]) + 1000 * int(sub["from_s"]) + 60000 * int(sub["from_m"]) + 3600000 * int(
-                sub["from_h"])
-            to_ms = int(sub["to_ms"]) + 1000 * int(sub["to_s"]) + 60000 * int(sub["to_m"]) + 3600000 * int(
-                sub["to_h"])
-            intervals[i] = TimeInterval(from_ms, to_ms)
-            texts[i] = sub["text"]
+    def from_elements(cls, elements):
+        intervals = []
+        texts = []
+        numbers = []
+        for element in elements:
+            intervals.append(element.interval)
+            texts.append(element.text)
+            numbers.append(element.number)
         return cls(intervals, texts, numbers)
 
+    @classmethod
+    def parse(cls, text):
+        return cls.from_elements(cls.iterparse(io.StringIO(text)))
+
     @staticmethod
     def _is_number(string):
         if string is None or len(string) == 0:
@@ -133,3 +224,24 @@ class SubRip:
                 return False
         return True
 
+
+class SubRipCursor:
+    """Cue at a moving time, searched for only when the time leaves the span of the current result.
+
+    During playback that is once per change of the cue, the rest of the moves cost one comparison.
+    """
+
+    def __init__(self, subrip):
+        self._subrip = subrip
+        self._sub = None
+        self._after = np.inf
+        self._until = -np.inf
+
+    @property
+    def sub(self):
+        return self._sub
+
+    def move(self, time):
+        if not self._after < time <= self._until:
+            self._sub, self._after, self._until = self._subrip.find_span(time)
+        return self._sub
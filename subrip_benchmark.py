@@ -0,0 +1,66 @@
+__author__ = 'emptysamurai'
+
+import argparse
+import os
+import re
+import tempfile
+from timeit import default_timer
+from subrip import SubRip, SubRipElement
+from timeinterval import TimeInterval
+
+_REGEX_PATTERN = r"(?P<number>\d+)\n(?P<from_h>\d+):(?P<from_m>\d+):(?P<from_s>\d+),(?P<from_ms>\d+)\s+-+>\s+(?P<to_h>\d+):(?P<to_m>\d+):(?P<to_s>\d+),(?P<to_ms>\d+)\n(?P<text>(.|\n)*?)(?=\n{2,}\d+\n\d+:\d+:\d+,\d+\s+-+>\s+\d+:\d+:\d+,\d+\n|\n*$)"
+
+
+def _regex_parse(text):
+    # the parser before iterparse: one regex over the whole file
+    elements = []
+    for match in re.finditer(_REGEX_PATTERN, text):
+        sub = match.groupdict()
+        from_ms = int(sub["from_ms"]) + 1000 * int(sub["from_s"]) + 60000 * int(sub["from_m"]) + 3600000 * int(
+            sub["from_h"])
+        to_ms = int(sub["to_ms"]) + 1000 * int(sub["to_s"]) + 60000 * int(sub["to_m"]) + 3600000 * int(sub["to_h"])
+        elements.append(SubRipElement(int(sub["number"]), TimeInterval(from_ms, to_ms), sub["text"]))
+    return elements
+
+
+def _write_synthetic_srt(path, size, newline):
+    # two-line cues until the file reaches the size
+    with open(path, "w", newline=newline) as f:
+        number = 0
+        while f.tell() < size:
+            begin = number * 3000
+            elements = [SubRipElement(number + i + 1, TimeInterval(begin + i * 3000, begin + i * 3000 + 2500),
+                                      "Sentence number %d,\nsecond line of it." % (number + i))
+                        for i in range(1000)]
+            number += len(elements)
+            f.write(str(SubRip.from_elements(elements)))
+
+
+def _measure(function):
+    start = default_timer()
+    result = function()
+    return default_timer() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the regex and the streaming SubRip parsers")
+    parser.add_argument("--size", type=float, default=50, help="Size of synthetic subtitles in megabytes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, newline in (("LF", "\n"), ("CRLF", "\r\n")):
+            path = os.path.join(directory, "synthetic.srt")
+            _write_synthetic_srt(path, args.size * 1024 * 1024, newline)
+
+            def parse_regex():
+                with open(path, newline="") as f:
+                    return _regex_parse(f.read())
+
+            def parse_streaming():
+                with open(path, newline="") as f:
+                    return list(SubRip.iterparse(f))
+
+            regex_time, regex_elements = _measure(parse_regex)
+            streaming_time, streaming_elements = _measure(parse_streaming)
+            print("%s, %.0f MB: regex %.2f s (%d cues), iterparse %.2f s (%d cues)" %
+                  (name, args.size, regex_time, len(regex_elements), streaming_time, len(streaming_elements)))
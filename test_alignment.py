@@ -0,0 +1,22 @@
+__author__ = 'emptysamurai'
+
+import unittest
+from audio2subs import realign_sentences
+from subrip import SubRip
+from timeinterval import IntervalArray
+
+
+class RealignSentencesTest(unittest.TestCase):
+    def test_boundaries_stay_before_next_cue(self):
+        # the silences chosen for the first sentences leave the last ones no silence to end in
+        previous = SubRip(IntervalArray([0], [500]), ["Old sentence here."])
+        intervals = IntervalArray([179, 408], [229, 458])
+        subtitles = realign_sentences(previous, intervals, 500, ["Abc def ghi."] * 4)
+        ends = [element.interval.end for element in subtitles.elements]
+        self.assertEqual(len(ends), 4)
+        self.assertTrue(all(end <= 500 for end in ends))
+        self.assertEqual(ends[-1], 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
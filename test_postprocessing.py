@@ -0,0 +1,82 @@
+__author__ = 'emptysamurai'
+
+import unittest
+import numpy as np
+from postprocessing import DecisionsSmoother, remove_short_runs, silence_runs
+
+_MIN_FRAMES_SPEECH = 5
+_MIN_FRAMES_SILENCE = 10
+
+
+def _baseline_decisions(decisions, min_frames_speech, min_frames_silence):
+    # the loop vad and simple_vad removed short runs with before the smoother
+    decisions = [bool(decision) for decision in decisions]
+    is_speech = False
+    start_index = 0
+    for i in range(len(decisions)):
+        if decisions[i] != is_speech:
+            length = i - start_index
+            if is_speech and length < min_frames_speech:
+                for j in range(start_index, i):
+                    decisions[j] = False
+                i -= length
+            elif (not is_speech) and length < min_frames_silence:
+                for j in range(start_index, i):
+                    decisions[j] = True
+                i -= length
+            is_speech = decisions[i]
+            start_index = i
+    return np.array(decisions, dtype=bool)
+
+
+def _random_decisions(random):
+    # runs of random lengths around the minimums
+    runs = random.randint(1, 3 * _MIN_FRAMES_SILENCE, random.randint(1, 40))
+    values = np.arange(len(runs)) % 2 == random.randint(2)
+    return np.repeat(values, runs)
+
+
+def _baseline_runs(decisions):
+    begins, ends = silence_runs(_baseline_decisions(decisions, _MIN_FRAMES_SPEECH, _MIN_FRAMES_SILENCE))
+    return list(zip(begins.tolist(), ends.tolist()))
+
+
+class RemoveShortRunsTest(unittest.TestCase):
+    def test_matches_baseline(self):
+        random = np.random.RandomState(0)
+        for _ in range(2000):
+            decisions = _random_decisions(random)
+            begins, ends = remove_short_runs(decisions, _MIN_FRAMES_SPEECH, _MIN_FRAMES_SILENCE)
+            self.assertEqual(list(zip(begins.tolist(), ends.tolist())), _baseline_runs(decisions))
+
+    def test_short_run_counts_toward_next_run(self):
+        # the flipped speech run starts the silence run after it, which is then long enough
+        decisions = np.repeat([False, True, False, True], [20, 3, 8, 20])
+        begins, ends = remove_short_runs(decisions, _MIN_FRAMES_SPEECH, _MIN_FRAMES_SILENCE)
+        self.assertEqual(list(zip(begins.tolist(), ends.tolist())), [(0, 31)])
+        self.assertEqual(_baseline_runs(decisions), [(0, 31)])
+
+
+class DecisionsSmootherTest(unittest.TestCase):
+    def test_blocks_match_baseline(self):
+        random = np.random.RandomState(1)
+        for _ in range(500):
+            decisions = _random_decisions(random)
+            smoother = DecisionsSmoother(_MIN_FRAMES_SPEECH, _MIN_FRAMES_SILENCE)
+            runs = []
+            cuts = np.sort(random.randint(0, len(decisions) + 1, random.randint(0, 5)))
+            for block in np.split(decisions, cuts):
+                runs.extend(smoother.feed(block))
+            runs.extend(smoother.finish())
+            self.assertEqual(runs, _baseline_runs(decisions))
+
+    def test_silence_returned_once_final(self):
+        # a silence run is final once the speech run after it is known to be long enough
+        decisions = np.repeat([False, True, False, True], [20, 30, 20, 30])
+        smoother = DecisionsSmoother(_MIN_FRAMES_SPEECH, _MIN_FRAMES_SILENCE)
+        self.assertEqual(smoother.feed(decisions), [(0, 20)])
+        self.assertEqual(smoother.finish(), [(50, 70)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+__author__ = 'emptysamurai'
+
+import io
+import random
+import unittest
+from subrip import SubRip, SubRipCursor, SubRipElement
+from subrip_benchmark import _regex_parse
+from timeinterval import TimeInterval
+
+_TEXT_LINES = ["Hello there.", "42", "- Who's there?", "007", "Line with trailing space ", "1 2 3"]
+
+
+def _random_cues(generator, count):
+    # overlapping and touching cues with numbers-only and blank lines in the text
+    cues = []
+    begin = 0
+    for number in range(1, count + 1):
+        begin += generator.choice([0, 1, 500, 2500])
+        end = begin + generator.choice([0, 1, 1000, 8000])
+        lines = [generator.choice(_TEXT_LINES) for _ in range(generator.randint(1, 3))]
+        if len(lines) > 1 and generator.random() < 0.2:
+            lines.insert(1, "")
+        cues.append((number, begin, end, "\n".join(lines)))
+    return cues
+
+
+def _srt_text(generator, cues):
+    pieces = []
+    for number, begin, end, text in cues:
+        element = SubRipElement(number, TimeInterval(begin, end), text)
+        pieces.append(str(element).rstrip("\n") + "\n" * generator.randint(2, 4))
+    return "".join(pieces)
+
+
+def _subrip(cues):
+    return SubRip([TimeInterval(begin, end) for _, begin, end, _ in cues], [text for _, _, _, text in cues])
+
+
+def _query_times(generator, cues, count):
+    # boundaries, times right next to them and random times, some before and after all the cues
+    times = []
+    for _, begin, end, _ in cues:
+        times.extend([begin - 1, begin - 0.5, begin, begin + 0.5, end - 0.5, end, end + 0.5, end + 1])
+    last = max(end for _, _, end, _ in cues)
+    times.extend(generator.uniform(-1000, last + 1000) for _ in range(count))
+    generator.shuffle(times)
+    return times
+
+
+def _brute_find(subrip, time):
+    return next((element for element in subrip.elements
+                 if element.interval.begin <= time <= element.interval.end), None)
+
+
+def _tuples(elements):
+    return [(element.number, element.interval.begin, element.interval.end, element.text) for element in elements]
+
+
+class IterparseTest(unittest.TestCase):
+    def test_matches_regex_parser(self):
+        generator = random.Random(0)
+        for _ in range(200):
+            cues = _random_cues(generator, generator.randint(1, 20))
+            text = _srt_text(generator, cues)
+            expected = _tuples(_regex_parse(text))
+            self.assertEqual(expected, cues)
+            self.assertEqual(_tuples(SubRip.iterparse(io.StringIO(text))), expected)
+            # CRLF line ends and a byte order mark, as read with newline=""
+            crlf = "\ufeff" + text.replace("\n", "\r\n")
+            self.assertEqual(_tuples(SubRip.iterparse(io.StringIO(crlf, newline=""))), expected)
+
+    def test_number_line_without_timing_is_text(self):
+        text = "1\n00:00:01,000 --> 00:00:02,000\nFirst\n\n2\nstill first\n\n3\n00:00:03,000 --> 00:00:04,000\nSecond\n"
+        self.assertEqual(_tuples(SubRip.iterparse(io.StringIO(text))), _tuples(_regex_parse(text)))
+        self.assertEqual(_tuples(SubRip.iterparse(io.StringIO(text))),
+                         [(1, 1000, 2000, "First\n\n2\nstill first"), (3, 3000, 4000, "Second")])
+
+
+class LookupTest(unittest.TestCase):
+    def test_find_matches_brute_force(self):
+        generator = random.Random(1)
+        for _ in range(100):
+            cues = _random_cues(generator, generator.randint(1, 20))
+            subrip = _subrip(cues)
+            for time in _query_times(generator, cues, 50):
+                self.assertIs(subrip.find(time), _brute_find(subrip, time))
+
+    def test_find_range_matches_brute_force(self):
+        generator = random.Random(2)
+        for _ in range(100):
+            cues = _random_cues(generator, generator.randint(1, 20))
+            subrip = _subrip(cues)
+            times = _query_times(generator, cues, 20)
+            for begin, end in zip(times, times[1:]):
+                begin, end = min(begin, end), max(begin, end)
+                expected = [element for element in subrip.elements
+                            if element.interval.begin <= end and element.interval.end >= begin]
+                self.assertEqual(subrip.find_range(begin, end), expected)
+
+    def test_cursor_matches_brute_force(self):
+        generator = random.Random(3)
+        for _ in range(100):
+            cues = _random_cues(generator, generator.randint(1, 20))
+            subrip = _subrip(cues)
+            cursor = SubRipCursor(subrip)
+            # playback moves forward over every boundary with seeks both ways
+            times = sorted(_query_times(generator, cues, 50))
+            i = 0
+            for _ in range(300):
+                i = generator.randrange(len(times)) if generator.random() < 0.1 else (i + 1) % len(times)
+                time = times[i]
+                self.assertIs(cursor.move(time), _brute_find(subrip, time))
+                self.assertIs(cursor.sub, _brute_find(subrip, time))
+
+    def test_empty(self):
+        subrip = SubRip([], [])
+        self.assertIsNone(subrip.find(0))
+        self.assertEqual(subrip.find_range(0, 1000), [])
+        self.assertIsNone(SubRipCursor(subrip).move(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
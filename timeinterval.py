@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class TimeInterval:
     @property
     def begin(self):
@@ -40,4 +43,118 @@ class TimeInterval:
 
     @classmethod
     def between(cls, begin, end):
-        return cls(begin.end, end.begin)
\ No newline at end of file
+        return cls(begin.end, end.begin)
+
+
+class _TimeIntervalView(TimeInterval):
+    # TimeInterval reading and writing an element of IntervalArray
+
+    @property
+    def begin(self):
+        return self._intervals.begins[self._index].item()
+
+    @begin.setter
+    def begin(self, value):
+        if self.end < value:
+            raise ValueError("End of the interval is earlier than start")
+        self._intervals._promote(value)
+        self._intervals.begins[self._index] = value
+
+    @property
+    def end(self):
+        return self._intervals.ends[self._index].item()
+
+    @end.setter
+    def end(self, value):
+        if value < self.begin:
+            raise ValueError("End of the interval is earlier than start")
+        self._intervals._promote(value)
+        self._intervals.ends[self._index] = value
+
+    def __init__(self, intervals, index):
+        self._intervals = intervals
+        self._index = index
+
+
+class IntervalArray:
+    """Time intervals stored as two contiguous arrays of begins and ends.
+
+    Operations work on all intervals at once and return arrays, indexing with an integer or
+    iterating gives TimeInterval views of the elements.
+    """
+
+    @property
+    def begins(self):
+        return self._begins
+
+    @property
+    def ends(self):
+        return self._ends
+
+    @property
+    def length(self):
+        return self._ends - self._begins
+
+    def __init__(self, begins, ends):
+        begins = np.asarray(begins)
+        ends = np.asarray(ends)
+        if begins.shape != ends.shape or begins.ndim != 1:
+            raise ValueError("Begins and ends must be one-dimensional arrays of the same length")
+        if np.any(ends < begins):
+            raise ValueError("End of the interval is earlier than start")
+        dtype = np.result_type(begins, ends, np.int64)
+        self._begins = begins.astype(dtype)
+        self._ends = ends.astype(dtype)
+
+    def _promote(self, value):
+        # integer arrays become float ones rather than truncate a float assigned to an element
+        dtype = np.result_type(self._begins, value)
+        if dtype != self._begins.dtype:
+            self._begins = self._begins.astype(dtype)
+            self._ends = self._ends.astype(dtype)
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        if isinstance(intervals, cls):
+            return intervals
+        return cls([interval.begin for interval in intervals], [interval.end for interval in intervals])
+
+    def __len__(self):
+        return len(self._begins)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            if not -len(self) <= item < len(self):
+                raise IndexError("Interval index out of range")
+            return _TimeIntervalView(self, item % len(self))
+        return IntervalArray(self._begins[item], self._ends[item])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield _TimeIntervalView(self, i)
+
+    def contains(self, time):
+        return (self._begins <= time) & (time <= self._ends)
+
+    def is_earlier(self, time):
+        return self._ends < time
+
+    def is_later(self, time):
+        return self._begins > time
+
+    def covers(self, times):
+        """Whether each of times is contained in any of the intervals."""
+        if len(self) == 0:
+            return np.zeros(np.shape(times), dtype=bool)
+        order = np.argsort(self._begins, kind="stable")
+        latest_ends = np.maximum.accumulate(self._ends[order])
+        indices = np.searchsorted(self._begins[order], times, side="right") - 1
+        return (indices >= 0) & (times <= latest_ends[np.maximum(indices, 0)])
+
+    def sorted(self):
+        """Intervals ordered by begin."""
+        return self[np.argsort(self._begins, kind="stable")]
+
+    @classmethod
+    def between(cls, begin, end):
+        return cls(begin.ends, end.begins)
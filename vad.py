@@ -1,137 +1,251 @@
-import wave
+import os
+from functools import lru_cache
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from timeinterval import TimeInterval
-import struct
+from audiosource import WaveSource, open_source, select_channels
+from features import band_mask, to_frames
+from postprocessing import DecisionsSmoother, to_time_intervals
+from profiling import span
+from resampling import Decimator, analysis_rate, decimate_range, resampled_length
+
+_FRAME_LENGTH = 10  # ms
+_READ_FRAMES = 2048
+_FIRST_FRAMES_SILENCE = 30
+_THRESHOLD_LEVEL = 10
+_MIN_FRAMES_SPEECH = 5
+_MIN_FRAMES_SILENCE = 10
+_SHARD_FRAMES = 16 * _READ_FRAMES
+_MIN_VOICE_FREQUENCY = 300
+_MAX_VOICE_FREQUENCY = 3000
+
+
+def engine_parameters():
+    """Parameters that affect the intervals found by get_silence_intervals."""
+    return {"frame_length": _FRAME_LENGTH, "first_frames_silence": _FIRST_FRAMES_SILENCE,
+            "threshold_level": _THRESHOLD_LEVEL, "min_frames_speech": _MIN_FRAMES_SPEECH,
+            "min_frames_silence": _MIN_FRAMES_SILENCE,
+            "voice_frequencies": [_MIN_VOICE_FREQUENCY, _MAX_VOICE_FREQUENCY], "resample": False,
+            "downmix": "mean"}
+
+
+@lru_cache(maxsize=None)
+def _voice_frequency_basis(length, sample_rate):
+    # cosines and sines of the bins of the voice band only, the rest of the spectrum is never needed
+    bins = np.flatnonzero(band_mask(_MIN_VOICE_FREQUENCY, _MAX_VOICE_FREQUENCY, length, sample_rate))
+    phases = 2 * np.pi * np.outer(np.arange(length), bins) / length
+    return np.concatenate((np.cos(phases), np.sin(phases)), axis=1)
+
+
+def _voice_frequency_energies(frames, sample_rate):
+    # same as the band energies of a FeatureBank, but only the bins of the band are computed,
+    # a matrix product is faster than the whole rfft for them at any rate
+    with span("vad.fft", frames=len(frames)):
+        length = frames.shape[-1]
+        # one product for all channels, a stack of small ones is much slower
+        coefficients = frames.reshape(-1, length) @ _voice_frequency_basis(length, sample_rate)
+        return np.einsum("ij,ij->i", coefficients, coefficients).reshape(frames.shape[:-1])
+
+
+def _read_blocks(audio, samples_per_frame, channel):
+    channels = audio.getnchannels()
+    while True:
+        with span("vad.decode") as decoding:
+            samples = audio.readframes(_READ_FRAMES * samples_per_frame)
+            block = select_channels(samples, channels, channel)
+            decoding.count("samples", len(samples))
+        if not len(samples):
+            break
+        yield block
+    audio.close()
+
+
+def _blocks_to_frames(blocks, samples_per_frame):
+    # regroups sample blocks of any size into arrays of whole frames
+    rest = None
+    for samples in blocks:
+        if rest is not None and len(rest):
+            samples = np.concatenate((rest, samples))
+        number_of_frames = len(samples) // samples_per_frame
+        rest = samples[number_of_frames * samples_per_frame:]
+        if number_of_frames:
+            yield to_frames(samples, number_of_frames, samples_per_frame)
+
+
+def _merge_channels(decisions):
+    # speech in any channel is speech
+    return decisions if decisions.ndim == 1 else decisions.any(axis=-1)
+
+
+def _frames_to_decisions(frames_blocks, sample_rate):
+    return _energies_to_decisions_blocks(_voice_frequency_energies(frames, sample_rate) for frames in frames_blocks)
+
+
+def _energies_to_decisions_blocks(energies_blocks):
+    # the first frames are assumed to be silence and give the noise level
+    first_energies = []
+    first_frames = 0
+    mean_frequency_energy = None
+    for frequency_energies in energies_blocks:
+        with span("vad.decisions", frames=len(frequency_energies)):
+            if mean_frequency_energy is None:
+                first_energies.append(frequency_energies)
+                first_frames += len(frequency_energies)
+                if first_frames < _FIRST_FRAMES_SILENCE:
+                    continue
+                frequency_energies = np.concatenate(first_energies)
+                # every channel has its own noise level
+                mean_frequency_energy = (np.sum(frequency_energies[:_FIRST_FRAMES_SILENCE], axis=0) /
+                                         _FIRST_FRAMES_SILENCE)
+                decisions = _merge_channels(_energies_to_decisions(frequency_energies, mean_frequency_energy))
+                decisions[:_FIRST_FRAMES_SILENCE] = False
+            else:
+                decisions = _merge_channels(_energies_to_decisions(frequency_energies, mean_frequency_energy))
+        yield decisions
 
+    if mean_frequency_energy is None:
+        raise ValueError("Audio file should be at least " + str(_FRAME_LENGTH * _FIRST_FRAMES_SILENCE) + "ms")
 
-def _hz_to_index(hz, length, sample_rate):
-    return round(hz * length / sample_rate)
 
+def _energies_to_decisions(frequency_energies, mean_frequency_energy):
+    # any energy is speech in a channel that was silent at the start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        decisions = frequency_energies / mean_frequency_energy > _THRESHOLD_LEVEL
+    return np.where(mean_frequency_energy == 0, frequency_energies != 0, decisions)
 
-def _voice_frequency_energy(frame, sample_rate):
-    fft_frame = np.fft.rfft(frame)
-    length = len(frame)
-    start_index = _hz_to_index(300, length, sample_rate)
-    end_index = _hz_to_index(3000, length, sample_rate)
-    upper_bound = len(fft_frame)
-    return sum(abs(fft_frame[i]) ** 2 for i in range(min(start_index, upper_bound-1), min(end_index + 1, upper_bound)))
 
+def _samples_per_frame(audio):
+    return int((audio.getframerate() * _FRAME_LENGTH) / 1000)
 
-def _bytes_to_samples(samples_bytes, bytes_per_frame):
-    length = len(samples_bytes) // bytes_per_frame
-    if bytes_per_frame == 4:
-        int_type = 'i'
-    elif bytes_per_frame == 2:
-        int_type = 'h'
-    elif bytes_per_frame == 1:
-        int_type = 'c'
-    elif bytes_per_frame == 8:
-        int_type = 'q'
-    else:
-        raise ValueError("Can't read "+str(bytes_per_frame)+"-byte audio")
 
-    return np.array(struct.unpack("<" + str(length) + int_type, samples_bytes))
+def _rate(sample_rate, resample):
+    return analysis_rate(sample_rate, _MAX_VOICE_FREQUENCY) if resample else sample_rate
 
 
-def _to_mono(samples, channels):
-    if channels == 1:
-        return samples
+def _analysis_samples(audio, start, stop, rate, channel):
+    # samples of the selected channels from start to stop at the analysis rate
+    channels = audio.getnchannels()
+    if rate == audio.getframerate():
+        return select_channels(audio.samples(start, stop), channels, channel)
+    return decimate_range(lambda begin, end: select_channels(audio.samples(begin, end), channels, channel),
+                          audio.getnframes(), start, stop, audio.getframerate(), rate, _MAX_VOICE_FREQUENCY)
+
+
+def _read_shard_decisions(path, first_frame, last_frame, mean_frequency_energy, rate, channel):
+    # runs in a worker process, every worker maps the file on its own
+    audio = WaveSource(path)
+    samples_per_frame = int((rate * _FRAME_LENGTH) / 1000)
+    decisions = np.empty(last_frame - first_frame, dtype=bool)
+    for start in range(first_frame, last_frame, _READ_FRAMES):
+        end = min(start + _READ_FRAMES, last_frame)
+        samples = _analysis_samples(audio, start * samples_per_frame, end * samples_per_frame, rate, channel)
+        frames = to_frames(samples, end - start, samples_per_frame)
+        frequency_energies = _voice_frequency_energies(frames, rate)
+        decisions[start - first_frame:end - first_frame] = _merge_channels(
+            _energies_to_decisions(frequency_energies, mean_frequency_energy))
+    audio.close()
+    if first_frame < _FIRST_FRAMES_SILENCE:
+        decisions[:_FIRST_FRAMES_SILENCE - first_frame] = False
+    return decisions
+
+
+def _parallel_decisions(path, workers, resample, channel):
+    # frames are independent once the noise level is known, so shards need no overlap
+    audio = WaveSource(path)
+    rate = _rate(audio.getframerate(), resample)
+    samples_per_frame = int((rate * _FRAME_LENGTH) / 1000)
+    number_of_frames = resampled_length(audio.getnframes(), audio.getframerate(), rate) // samples_per_frame
+    if number_of_frames < _FIRST_FRAMES_SILENCE:
+        raise ValueError("Audio file should be at least " + str(_FRAME_LENGTH * _FIRST_FRAMES_SILENCE) + "ms")
+    samples = _analysis_samples(audio, 0, _FIRST_FRAMES_SILENCE * samples_per_frame, rate, channel)
+    frames = to_frames(samples, _FIRST_FRAMES_SILENCE, samples_per_frame)
+    mean_frequency_energy = np.sum(_voice_frequency_energies(frames, rate), axis=0) / _FIRST_FRAMES_SILENCE
+    audio.close()
+
+    starts = range(0, number_of_frames, _SHARD_FRAMES)
+    ends = [min(start + _SHARD_FRAMES, number_of_frames) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_read_shard_decisions, [path] * len(starts), starts, ends,
+                               [mean_frequency_energy] * len(starts), [rate] * len(starts), [channel] * len(starts))
+        # shards run in other processes, only the time spent waiting for them is seen here
+        while True:
+            with span("vad.shards") as waiting:
+                decisions = next(results, None)
+                waiting.count("frames", len(decisions) if decisions is not None else 0)
+            if decisions is None:
+                break
+            yield decisions
+
+
+def _smooth(decisions_blocks):
+    smoother = DecisionsSmoother(_MIN_FRAMES_SPEECH, _MIN_FRAMES_SILENCE)
+    for decisions in decisions_blocks:
+        with span("vad.smoothing", frames=len(decisions)):
+            silences = smoother.feed(decisions)
+        yield from silences
+    with span("vad.smoothing"):
+        silences = smoother.finish()
+    yield from silences
+
+
+def _runs_to_intervals(runs):
+    runs = np.array(list(runs), dtype=np.int64).reshape(-1, 2)
+    return to_time_intervals(runs[:, 0], runs[:, 1], _FRAME_LENGTH)
+
+
+def _iter_silence_runs(source, sample_rate, workers, resample, channel):
+    if workers is None:
+        workers = os.cpu_count()
+    if workers > 1:
+        if sample_rate is not None or hasattr(source, "read"):
+            raise ValueError("Parallel processing needs a path to a wave file")
+        decisions_blocks = _parallel_decisions(source, workers, resample, channel)
     else:
-        return np.array([np.mean(i) for i in np.split(samples, samples // channels)])
-
-
-def _samples_to_frames(samples, number_of_frames):
-    return np.split(np.resize(samples, len(samples) - len(samples) % number_of_frames), number_of_frames)
-
-
-def _decisions_to_silence_time_intervals(decisions, frame_length):
-    intervals = []
-    is_silence = not decisions[0]
-    if is_silence:
-        intervals.append(TimeInterval(0, frame_length))
-    for i in range(len(decisions)):
-        if not decisions[i]:
-            if is_silence:
-                last = intervals[len(intervals) - 1]
-                last.end += frame_length
-            else:
-                time = i * frame_length
-                intervals.append(TimeInterval(time, time + frame_length))
-            is_silence = True
+        if sample_rate is None:
+            audio = open_source(source)
+            sample_rate = audio.getframerate()
+            blocks = _read_blocks(audio, _samples_per_frame(audio), channel)
         else:
-            is_silence = False
-    return intervals
-
-
-def get_silence_intervals(path):
-    # initial constants
-    frame_length = 10  # ms
-    read_frames = 2048
-    first_frames_silence = 30
-    threshold_level = 10
-    min_frames_speech = 5
-    min_frames_silence = 10
-
-    # open file
-    audio = wave.open(path, "rb")
-    bytes_per_frame = audio.getsampwidth()
-    sample_rate = audio.getframerate()
-    channels = audio.getnchannels()
-    samples_per_frame = int((sample_rate * frame_length * channels) / 1000)
-    number_of_frames = audio.getnframes() // samples_per_frame
-
-    if number_of_frames < first_frames_silence:
-        raise ValueError("Audio file should be at least " + str(frame_length * first_frames_silence) + "ms")
-
-    current_frame = 0
-
-    # estimating silence energy
-    decisions = [False] * number_of_frames
-    samples_bytes = audio.readframes(first_frames_silence * samples_per_frame)
-    current_frame += first_frames_silence
-    samples = _to_mono(_bytes_to_samples(samples_bytes, bytes_per_frame), channels)
-    frames = _samples_to_frames(samples, first_frames_silence)
-
-    mean_frequency_energy = 0
-    for frame in frames:
-        mean_frequency_energy += _voice_frequency_energy(frame, sample_rate)
-    mean_frequency_energy /= first_frames_silence
-
-    # main evaluation
-    read_samples = read_frames * samples_per_frame
-    mean_frequency_energy_zero = mean_frequency_energy == 0
-    while current_frame < number_of_frames:
-        if number_of_frames - current_frame < read_frames:
-            read_frames = number_of_frames - current_frame
-            read_samples = read_frames * samples_per_frame
-
-        samples_bytes = audio.readframes(read_samples)
-        samples = _to_mono(_bytes_to_samples(samples_bytes, bytes_per_frame), channels)
-        frames = _samples_to_frames(samples, read_frames)
-        for frame in frames:
-            frequency_energy = _voice_frequency_energy(frame, sample_rate)
-            if mean_frequency_energy_zero:
-                decisions[current_frame] = bool(frequency_energy)
-            else:
-                if frequency_energy / mean_frequency_energy > threshold_level:
-                    decisions[current_frame] = True
-            current_frame += 1
-
-    # removing short intervals
-    is_speech = False
-    start_index = 0
-    for i in range(len(decisions)):
-        if decisions[i] != is_speech:
-            length = i - start_index
-            if is_speech and length < min_frames_speech:
-                for j in range(start_index, i):
-                    decisions[j] = False
-                i -= length
-            elif (not is_speech) and length < min_frames_silence:
-                for j in range(start_index, i):
-                    decisions[j] = True
-                i -= length
-            is_speech = decisions[i]
-            start_index = i
-
-    return _decisions_to_silence_time_intervals(decisions, frame_length)
\ No newline at end of file
+            blocks = source
+        rate = _rate(sample_rate, resample)
+        if rate != sample_rate:
+            blocks = Decimator(sample_rate, rate, _MAX_VOICE_FREQUENCY).blocks(blocks)
+        samples_per_frame = int((rate * _FRAME_LENGTH) / 1000)
+        decisions_blocks = _frames_to_decisions(_blocks_to_frames(blocks, samples_per_frame), rate)
+    return _smooth(decisions_blocks)
+
+
+def iter_silence_intervals(source, sample_rate=None, workers=1, resample=False, channel=None):
+    """Yields silence intervals as soon as smoothing can't change them anymore.
+
+    source is a path to a wave file, a file object with wave data or an iterable of blocks of samples
+    with the given sample_rate, 1-D for mono or with a column per channel. Memory use doesn't depend on
+    the duration of the audio. With more than one worker (None for all cores) a wave file given by path
+    is split into shards processed in a process pool. Only the voice band of the spectrum is computed, so
+    audio above 16 kHz is analyzed at its own rate unless resample is True, then it is resampled to 8 kHz
+    first. Channels of a wave file are mixed when channel is None, channel picks one
+    by index and "each" finds speech in every channel independently, speech in any of them is speech.
+    """
+    for start, end in _iter_silence_runs(source, sample_rate, workers, resample, channel):
+        yield TimeInterval(start * _FRAME_LENGTH, end * _FRAME_LENGTH)
+
+
+def energies_to_silence_intervals(frequency_energies):
+    """Silence intervals of frames with the given voice frequency energies, with a column per channel
+    when channels are analyzed independently."""
+    with span("vad.get_silence_intervals", frames=len(frequency_energies)):
+        return _runs_to_intervals(_smooth(_energies_to_decisions_blocks([frequency_energies])))
+
+
+def get_silence_intervals(path, workers=1, resample=False, channel=None, bank=None):
+    """Silence intervals of a wave file as iter_silence_intervals finds them.
+
+    With a FeatureBank of frame_length 10 ms the voice frequency energies are taken from it at its rate
+    and channels instead.
+    """
+    if bank is not None:
+        if bank.frame_length != _FRAME_LENGTH:
+            raise ValueError("VAD needs frames of " + str(_FRAME_LENGTH) + "ms")
+        return energies_to_silence_intervals(bank.band_energies(_MIN_VOICE_FREQUENCY, _MAX_VOICE_FREQUENCY))
+    with span("vad.get_silence_intervals"):
+        return _runs_to_intervals(_iter_silence_runs(path, None, workers, resample, channel))
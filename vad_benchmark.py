@@ -0,0 +1,115 @@
+__author__ = 'emptysamurai'
+
+import argparse
+import os
+import tempfile
+import wave
+import numpy as np
+import vad
+from benchmark_suite import write_synthetic_wav
+from features import FeatureBank, hz_to_index
+from resampling import analysis_rate
+from timeit import default_timer
+
+
+def _per_frame_voice_frequency_energies(frames, sample_rate):
+    # the engine before vectorization: one rfft and one python sum per frame
+    result = np.empty(len(frames))
+    for i, frame in enumerate(frames):
+        fft_frame = np.fft.rfft(frame)
+        length = len(frame)
+        start_index = hz_to_index(300, length, sample_rate)
+        end_index = hz_to_index(3000, length, sample_rate)
+        upper_bound = len(fft_frame)
+        result[i] = sum(abs(fft_frame[j]) ** 2
+                        for j in range(min(start_index, upper_bound - 1), min(end_index + 1, upper_bound)))
+    return result
+
+
+def _measure(function):
+    start = default_timer()
+    result = function()
+    return default_timer() - start, result
+
+
+def _measure_features(bank):
+    # time of the spectra and band energies alone, the audio is decoded and resampled before
+    bank.samples
+    features_time, _ = _measure(lambda: bank.band_energies(vad._MIN_VOICE_FREQUENCY, vad._MAX_VOICE_FREQUENCY))
+    return features_time, bank.frames.size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares per-frame and batched VAD feature engines, resampled "
+                                                 "and stereo analysis")
+    parser.add_argument("--duration", type=float, default=3600, help="Duration of synthetic audio in seconds")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Sample rate of synthetic audio")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of processes for parallel VAD")
+    parser.add_argument("--resample-rate", type=int, default=48000,
+                        help="Sample rate of synthetic audio for comparing resampled and full-rate VAD")
+    parser.add_argument("--tolerance", type=float, default=0.99,
+                        help="Least share of 10 ms frames resampled VAD must agree with full-rate VAD on")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.wav")
+        write_synthetic_wav(path, args.duration, args.sample_rate)
+
+        frames_per_block = 2048
+        samples_per_frame = args.sample_rate // 100
+        audio = wave.open(path, "rb")
+        block = audio.readframes(frames_per_block * samples_per_frame)
+        audio.close()
+        frames = np.frombuffer(block, dtype="<i2").reshape(frames_per_block, samples_per_frame)
+        number_of_blocks = args.duration * 100 / frames_per_block
+
+        per_frame_time, per_frame_result = _measure(
+            lambda: _per_frame_voice_frequency_energies(frames, args.sample_rate))
+        batched_time, batched_result = _measure(lambda: vad._voice_frequency_energies(frames, args.sample_rate))
+        if not np.allclose(per_frame_result, batched_result):
+            raise AssertionError("Batched energies differ from per-frame energies")
+
+        print("Features, per-frame (extrapolated): %.2f s" % (per_frame_time * number_of_blocks))
+        print("Features, batched (extrapolated): %.2f s" % (batched_time * number_of_blocks))
+        print("Speedup: %.1fx" % (per_frame_time / batched_time))
+
+        total_time, intervals = _measure(lambda: vad.get_silence_intervals(path))
+        print("get_silence_intervals on %.0f s of audio: %.2f s (%d silence intervals)" %
+              (args.duration, total_time, len(intervals)))
+
+        parallel_time, parallel_intervals = _measure(lambda: vad.get_silence_intervals(path, workers=args.workers))
+        if [(i.begin, i.end) for i in parallel_intervals] != [(i.begin, i.end) for i in intervals]:
+            raise AssertionError("Parallel intervals differ from serial intervals")
+        print("get_silence_intervals with %d workers: %.2f s (%.1fx)" %
+              (args.workers, parallel_time, total_time / parallel_time))
+
+        path = os.path.join(directory, "synthetic_high_rate.wav")
+        write_synthetic_wav(path, args.duration, args.resample_rate)
+        full_time, full_intervals = _measure(lambda: vad.get_silence_intervals(path))
+        resampled_time, resampled_intervals = _measure(lambda: vad.get_silence_intervals(path, resample=True))
+        bank = FeatureBank(path)
+        spectrum_time, full_samples = _measure_features(bank)
+        band_time, _ = _measure(lambda: vad._voice_frequency_energies(bank.frames, args.resample_rate))
+        resampled_features_time, resampled_samples = _measure_features(
+            FeatureBank(path, sample_rate=analysis_rate(args.resample_rate, vad._MAX_VOICE_FREQUENCY),
+                        max_frequency=vad._MAX_VOICE_FREQUENCY))
+        times = np.arange(0, args.duration * 1000, 10)
+        agreement = np.mean(full_intervals.covers(times) == resampled_intervals.covers(times))
+        print("Features at %d Hz: %d samples, whole spectrum %.2f s, voice band only %.2f s" %
+              (args.resample_rate, full_samples, spectrum_time, band_time))
+        print("Features resampled: %d samples, %.2f s, %.1fx fewer samples" %
+              (resampled_samples, resampled_features_time, full_samples / resampled_samples))
+        print("get_silence_intervals at %d Hz: %.2f s, resampled first: %.2f s (%.1fx)" %
+              (args.resample_rate, full_time, resampled_time, resampled_time / full_time))
+        print("Agreement of resampled and full-rate decisions: %.4f" % agreement)
+        if agreement < args.tolerance:
+            raise AssertionError("Resampled decisions agree on less than %.4f of frames" % args.tolerance)
+
+        path = os.path.join(directory, "synthetic_stereo.wav")
+        write_synthetic_wav(path, args.duration, args.sample_rate, channels=2)
+        for channel, name in ((None, "mixed"), ("each", "each channel")):
+            stereo_time, stereo_intervals = _measure(lambda: vad.get_silence_intervals(path, channel=channel))
+            if [(i.begin, i.end) for i in stereo_intervals] != [(i.begin, i.end) for i in intervals]:
+                raise AssertionError("Stereo intervals differ from mono intervals")
+            print("get_silence_intervals on stereo audio, %s: %.2f s (%.2fx the cost of mono)" %
+                  (name, stereo_time, stereo_time / total_time))
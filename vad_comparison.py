@@ -3,21 +3,13 @@ __author__ = 'emptysamurai'
 import matplotlib.pyplot as plt
 import numpy as np
 import argparse
-import wave
+from features import FeatureBank
 import vad
 import simple_vad
 import lsfm_vad
-from scipy.io.wavfile import read
 from timeit import Timer
 
 
-def _time_in_interval(ms, intervals):
-    for interval in intervals:
-        if interval.contains(ms):
-            return True
-    return False
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("audio_path", help="Path to the audio wave file")
@@ -26,20 +18,21 @@ if __name__ == "__main__":
     step = 10
 
     path_to_file = args.audio_path
-    (sample_rate, samples) = read(path_to_file)
-    audio = wave.open(path_to_file, "rb")
-    sample_rate = audio.getframerate()
-    channels = audio.getnchannels()
-    number_of_samples = audio.getnframes()
-    duration = int(number_of_samples / channels / sample_rate * 1000)
-
-    my_vad_intervals = vad.get_silence_intervals(path_to_file)
-    simple_vad_intervals = simple_vad.get_silence_intervals(path_to_file)
-    lsfm_vad_intervals = lsfm_vad.get_silence_intervals(path_to_file)
-
-    my_vad_decisions = np.array([not _time_in_interval(t, my_vad_intervals) for t in range(0, duration, step)])
-    simple_vad_decisions = np.array([not _time_in_interval(t, simple_vad_intervals) for t in range(0, duration, step)])
-    lsfm_vad_decisions = np.array([not _time_in_interval(t, lsfm_vad_intervals) for t in range(0, duration, step)])
+    # detectors run at the rates they use without a bank: vad and simple_vad share the spectrogram at the
+    # rate of the file, LSFM frames the same samples or resamples audio above 16 kHz
+    bank = FeatureBank(path_to_file)
+    lsfm_bank = lsfm_vad.feature_bank(path_to_file, bank=bank)
+    samples = bank.samples
+    sample_rate = bank.sample_rate
+    duration = int(len(samples) / sample_rate * 1000)
+
+    my_vad_intervals = vad.get_silence_intervals(path_to_file, bank=bank)
+    simple_vad_intervals = simple_vad.get_silence_intervals(path_to_file, bank=bank)
+    lsfm_vad_intervals = lsfm_vad.get_silence_intervals(path_to_file, bank=lsfm_bank)
+
+    my_vad_decisions = ~my_vad_intervals.covers(np.arange(0, duration, step))
+    simple_vad_decisions = ~simple_vad_intervals.covers(np.arange(0, duration, step))
+    lsfm_vad_decisions = ~lsfm_vad_intervals.covers(np.arange(0, duration, step))
 
     repeat_times = 10
     my_vad_time = Timer(lambda: vad.get_silence_intervals(path_to_file)).timeit(repeat_times)
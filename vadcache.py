@@ -0,0 +1,97 @@
+__author__ = 'emptysamurai'
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import vad
+from profiling import span
+from timeinterval import IntervalArray
+
+_MAX_SIZE = 64 * 1024 * 1024  # bytes
+_HASH_BLOCK = 1024 * 1024  # bytes
+
+
+def default_directory():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "audio2subs", "vad")
+
+
+class VadCache:
+    """On-disk cache of silence intervals keyed by audio content and VAD parameters.
+
+    Intervals are stored as binary arrays of begins and ends. Every hit refreshes the modification
+    time of the entry, and the least recently used entries are removed when the cache grows over
+    max_size bytes.
+    """
+
+    def __init__(self, directory=None, max_size=_MAX_SIZE):
+        self._directory = directory if directory is not None else default_directory()
+        self._max_size = max_size
+        os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def _key(self, path, channel):
+        key = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                key.update(block)
+        engine = {"engine": vad.__name__, "parameters": vad.engine_parameters(), "channel": channel}
+        key.update(json.dumps(engine, sort_keys=True).encode())
+        return key.hexdigest()
+
+    def get_silence_intervals(self, path, workers=1, channel=None):
+        with span("vadcache.lookup") as lookup:
+            entry = os.path.join(self._directory, self._key(path, channel) + ".npy")
+            try:
+                intervals = np.load(entry)
+                os.utime(entry)
+                lookup.count("hits")
+                return IntervalArray(intervals[0], intervals[1])
+            except (OSError, ValueError):
+                lookup.count("misses")
+
+        intervals = vad.get_silence_intervals(path, workers=workers, channel=channel)
+        with span("vadcache.store"):
+            self._store(entry, np.stack((intervals.begins, intervals.ends)))
+            self._evict()
+        return intervals
+
+    def _store(self, entry, array):
+        # written aside and renamed, so readers in other processes never see half an entry
+        descriptor, temporary = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                np.save(f, array)
+            os.replace(temporary, entry)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self._directory):
+            if name.endswith(".npy"):
+                try:
+                    stat = os.stat(os.path.join(self._directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self._max_size:
+                break
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for name in os.listdir(self._directory):
+            if name.endswith(".npy"):
+                os.remove(os.path.join(self._directory, name))